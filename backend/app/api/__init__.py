@@ -3,12 +3,14 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-import json
+from typing import BinaryIO
+import io
+import orjson
 
-from ..database import get_session
+from ..database import get_session, get_read_session
 from ..models import IngestResponse, ChatRequest
 from ..services import IngestionService, ChatService
-from ..repository import DocumentRepository
+from ..repository import DocumentRepository, BatchedSimilaritySearch
 from ..logging_config import get_logger
 from ..exceptions import (
     DocumentExtractionError,
@@ -25,10 +27,53 @@ router = APIRouter(prefix="/api/v1", tags=["v1"])
 # Initialize services
 ingestion_service = IngestionService()
 chat_service = ChatService()
+similarity_search = BatchedSimilaritySearch()
 
 # Constants
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+# Server-sent event framing, pre-encoded so frames are yielded as bytes
+_SSE_PREFIX = b"data: "
+_SSE_SUFFIX = b"\n\n"
+
+
+def sse_event(payload: dict) -> bytes:
+    """Encode a payload as a server-sent event frame."""
+    return _SSE_PREFIX + orjson.dumps(payload) + _SSE_SUFFIX
+
+
+SSE_DONE = sse_event({"type": "done"})
+
+
+def open_upload(file: UploadFile, max_size: int = MAX_FILE_SIZE) -> tuple[BinaryIO, int]:
+    """
+    Validate an upload's size and return its file rewound to the start.
+    
+    Starlette already spools multipart uploads to a temporary file, so the
+    body is handed to the parser as a stream instead of being read into memory.
+    
+    Raises:
+        HTTPException: If the upload is empty or larger than max_size
+    """
+    size = file.size
+    if size is None:
+        size = file.file.seek(0, io.SEEK_END)
+    
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty file uploaded")
+    
+    if size > max_size:
+        logger.warning(
+            "File too large",
+            filename=file.filename,
+            size=size,
+            max_size=max_size
+        )
+        raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
+    
+    file.file.seek(0)
+    return file.file, size
+
 
 @router.post("/ingest", response_model=IngestResponse)
 async def ingest_document(
@@ -50,22 +95,10 @@ async def ingest_document(
         logger.warning("Unsupported file type uploaded", filename=file.filename)
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
+    content, size = open_upload(file)
+    
     try:
-        content = await file.read()
-        
-        if len(content) == 0:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
-        
-        if len(content) > MAX_FILE_SIZE:
-            logger.warning(
-                "File too large",
-                filename=file.filename,
-                size=len(content),
-                max_size=MAX_FILE_SIZE
-            )
-            raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
-        
-        logger.info("Starting document ingestion", filename=file.filename, size=len(content))
+        logger.info("Starting document ingestion", filename=file.filename, size=size)
         
         document_id, chunks_created = await ingestion_service.ingest_document(
             filename=file.filename,
@@ -100,10 +133,7 @@ async def ingest_document(
 
 
 @router.post("/chat")
-async def chat(
-    request: ChatRequest,
-    session: AsyncSession = Depends(get_session)
-):
+async def chat(request: ChatRequest):
     """
     Chat with the RAG system.
     
@@ -117,20 +147,14 @@ async def chat(
         logger.info("Chat request received", message_length=len(request.message))
         
         # Generate embedding for the query
-        query_embedding = await chat_service.embedding_service.get_embedding(
-            request.message
-        )
+        query_embedding = await chat_service.embed_query(request.message)
         
-        # Use repository for similarity search
-        repo = DocumentRepository(session)
-        results = await repo.similarity_search(
+        # Concurrent chats share one similarity-search round-trip
+        relevant_chunks = await similarity_search.similarity_search(
             query_embedding=query_embedding,
             top_k=5
         )
         
-        # Extract chunks from results
-        relevant_chunks = [chunk for chunk, score in results]
-        
         # Build context from chunks
         context = chat_service.build_context(relevant_chunks)
         
@@ -141,10 +165,10 @@ async def chat(
         
         async def generate():
             """Generate streaming response with SSE format."""
-            sources = list(set(chunk.document_name for chunk in relevant_chunks))
+            sources = list(dict.fromkeys(chunk.document_name for chunk in relevant_chunks))
             
             # Send sources first
-            yield f"data: {json.dumps({'type': 'sources', 'data': sources})}\n\n"
+            yield sse_event({"type": "sources", "data": sources})
             
             # Stream LLM response
             async for chunk in chat_service.stream_chat_response(
@@ -152,10 +176,10 @@ async def chat(
                 context=context,
                 history=history
             ):
-                yield f"data: {json.dumps({'type': 'content', 'data': chunk})}\n\n"
+                yield sse_event({"type": "content", "data": chunk})
             
             # Send done signal
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield SSE_DONE
         
         return StreamingResponse(
             generate(),
@@ -176,14 +200,13 @@ async def chat(
 
 
 @router.get("/documents")
-async def list_documents(session: AsyncSession = Depends(get_session)):
+async def list_documents(session: AsyncSession = Depends(get_read_session)):
     """List all ingested documents."""
     try:
-        repo = DocumentRepository(session)
-        documents = await repo.list_documents()
-        total = await repo.count_documents()
+        documents = await DocumentRepository(session).list_documents()
         
-        return {"documents": documents, "total": total}
+        # The listing is complete, so its length is the total; no COUNT query
+        return {"documents": documents, "total": len(documents)}
         
     except Exception as e:
         logger.exception("Failed to list documents")
@@ -221,7 +244,7 @@ async def delete_document(
 
 
 @router.get("/stats")
-async def get_stats(session: AsyncSession = Depends(get_session)):
+async def get_stats(session: AsyncSession = Depends(get_read_session)):
     """Get system statistics."""
     try:
         repo = DocumentRepository(session)
@@ -1,12 +1,19 @@
 """Database connection and session management."""
 
+import asyncio
+import asyncpg
+from pgvector.asyncpg import register_vector
 from sqlmodel import SQLModel
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
-from .config import get_settings
+from sqlalchemy.engine import make_url
+from .config import get_settings, configure_hnsw_params
+from .exceptions import DatabaseConnectionError
+from .logging_config import get_logger
 
 settings = get_settings()
+logger = get_logger(__name__)
 
 # Create async engine
 engine = create_async_engine(
@@ -14,10 +21,37 @@ engine = create_async_engine(
     echo=False,
     future=True,
     pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    connect_args={
+        "prepared_statement_cache_size": settings.db_statement_cache_size,
+        "statement_cache_size": settings.db_statement_cache_size,
+    }
 )
 
+# HNSW parameters in effect; replaced by init_db when auto-tuning
+hnsw_params: dict[str, int] = {
+    "m": settings.hnsw_m,
+    "ef_construction": settings.hnsw_ef_construction,
+    "ef_search": settings.hnsw_ef_search,
+}
+
+
+def vector_search_settings() -> dict[str, str]:
+    """Query-time settings for the configured vector index type."""
+    if settings.vector_index_type == "ivfflat":
+        return {"ivfflat.probes": str(int(settings.ivfflat_probes))}
+    return {"hnsw.ef_search": str(int(hnsw_params["ef_search"]))}
+
+
+# Autocommit view of the same pool for read-only requests: statements run
+# without BEGIN/COMMIT round-trips
+read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+# Raw asyncpg pool for the similarity-search hot path (created on startup)
+pg_pool: asyncpg.Pool | None = None
+
 # Create async session factory
 async_session = sessionmaker(
     engine,
@@ -25,24 +59,304 @@ async_session = sessionmaker(
     expire_on_commit=False
 )
 
+read_session = sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+
+# Set by init_db when the IVFFlat index is deferred until enough rows exist
+ivfflat_index_pending = False
+
+# Rows known to be in document_chunks while the index is pending; ingests
+# add theirs, so the table is only counted again once they may be enough
+ivfflat_rows = 0
+
+# Background build started by schedule_ivfflat_index, if one is running
+_ivfflat_task: asyncio.Task | None = None
+
+# Advisory lock key so only one replica builds the deferred IVFFlat index
+_IVFFLAT_LOCK_KEY = 0x1F5F1A7
+
+
+async def _set_index_build_params(conn, local: bool = True) -> None:
+    """
+    Raise memory and parallelism for index builds.
+    
+    local limits them to the current transaction; otherwise they last for
+    the session until _reset_index_build_params.
+    """
+    await conn.execute(
+        text("SELECT set_config('maintenance_work_mem', :mem, :local)"),
+        {"mem": settings.index_maintenance_work_mem, "local": local}
+    )
+    await conn.execute(
+        text("SELECT set_config('max_parallel_maintenance_workers', :workers, :local)"),
+        {"workers": str(settings.index_max_parallel_workers), "local": local}
+    )
+
+
+async def _reset_index_build_params(conn) -> None:
+    """Undo session-level _set_index_build_params before the pool reuses conn."""
+    await conn.execute(text("RESET maintenance_work_mem"))
+    await conn.execute(text("RESET max_parallel_maintenance_workers"))
+
+
+def _ivfflat_min_rows() -> int:
+    """Rows needed before the IVFFlat index is worth training."""
+    return int(settings.ivfflat_lists) * settings.ivfflat_min_rows_per_list
+
 
-async def init_db():
-    """Initialize database: create tables and enable pgvector extension."""
+async def _build_ivfflat_index(conn, concurrently: bool = False) -> bool:
+    """
+    Create or rebuild the IVFFlat index once the table can train it.
+    
+    IVFFlat picks its list centroids from the rows present at build time, so
+    an index built on a near-empty table keeps poor lists for good. The row
+    count each build was trained on is recorded as the index comment, and an
+    index trained on too few rows is rebuilt once enough data exists.
+    
+    With concurrently, conn must be in autocommit mode; the index is then
+    built without blocking writes to the table.
+    
+    Returns:
+        True if a sufficiently trained index is in place
+    """
+    global ivfflat_rows
+    min_rows = _ivfflat_min_rows()
+    concurrently_sql = "CONCURRENTLY" if concurrently else ""
+    count = await conn.scalar(text("SELECT count(*) FROM document_chunks")) or 0
+    exists, comment = (await conn.execute(text("""
+        SELECT to_regclass('idx_chunks_embedding_ivfflat') IS NOT NULL,
+               obj_description(to_regclass('idx_chunks_embedding_ivfflat'), 'pg_class')
+    """))).one()
+    trained_rows = int(comment) if comment and comment.isdigit() else 0
+    
+    if trained_rows >= min_rows:
+        return True
+    
+    if count < min_rows:
+        # Exact scans are cheap at this size; drop any undertrained index
+        await conn.execute(text(
+            f"DROP INDEX {concurrently_sql} IF EXISTS idx_chunks_embedding_ivfflat"
+        ))
+        ivfflat_rows = count
+        logger.info("IVFFlat index deferred", rows=count, min_rows=min_rows)
+        return False
+    
+    if exists:
+        # Also rebuilds an index left invalid by a failed concurrent build
+        await conn.execute(text(
+            f"REINDEX INDEX {concurrently_sql} idx_chunks_embedding_ivfflat"
+        ))
+    else:
+        await conn.execute(text(f"""
+            CREATE INDEX {concurrently_sql} idx_chunks_embedding_ivfflat
+            ON document_chunks USING ivfflat (embedding halfvec_ip_ops)
+            WITH (lists = {int(settings.ivfflat_lists)})
+        """))
+    await conn.execute(text(f"COMMENT ON INDEX idx_chunks_embedding_ivfflat IS '{int(count)}'"))
+    logger.info("IVFFlat index built", rows=count, lists=settings.ivfflat_lists)
+    return True
+
+
+async def ensure_ivfflat_index() -> None:
+    """
+    Build the IVFFlat index deferred by init_db once enough rows exist.
+    
+    Runs on an autocommit connection so the index is built concurrently
+    and ingests keep writing to the table meanwhile.
+    """
+    global ivfflat_index_pending
+    if not ivfflat_index_pending:
+        return
+    async with read_engine.connect() as conn:
+        # Another replica is already building it
+        locked = await conn.scalar(
+            text("SELECT pg_try_advisory_lock(:key)"),
+            {"key": _IVFFLAT_LOCK_KEY}
+        )
+        if not locked:
+            return
+        try:
+            await _set_index_build_params(conn, local=False)
+            ivfflat_index_pending = not await _build_ivfflat_index(conn, concurrently=True)
+        finally:
+            await _reset_index_build_params(conn)
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": _IVFFLAT_LOCK_KEY}
+            )
+
+
+async def _run_ivfflat_build() -> None:
+    """Background task for schedule_ivfflat_index; logs its own errors."""
+    global _ivfflat_task
+    try:
+        await ensure_ivfflat_index()
+    except Exception as e:
+        logger.error("IVFFlat index build failed", error=str(e))
+    finally:
+        _ivfflat_task = None
+
+
+def schedule_ivfflat_index(new_rows: int) -> None:
+    """
+    Account for rows added by an ingest and start a background build of
+    the deferred IVFFlat index once there may be enough to train it.
+    
+    The caller does not wait for the build, and its errors are only logged.
+    """
+    global ivfflat_rows, _ivfflat_task
+    if not ivfflat_index_pending:
+        return
+    ivfflat_rows += new_rows
+    if ivfflat_rows < _ivfflat_min_rows() or _ivfflat_task is not None:
+        return
+    _ivfflat_task = asyncio.get_running_loop().create_task(_run_ivfflat_build())
+
+
+async def cancel_ivfflat_build() -> None:
+    """Stop a running background IVFFlat build (on shutdown)."""
+    task = _ivfflat_task
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def init_db() -> dict[str, int]:
+    """
+    Initialize database: enable pgvector, create tables and vector index.
+    
+    Returns:
+        The HNSW parameters in effect
+    """
+    global ivfflat_index_pending
+    dim = int(settings.embedding_dimension)
     async with engine.begin() as conn:
         # Enable pgvector extension
         await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
         # Create all tables
         await conn.run_sync(SQLModel.metadata.create_all)
+        # Composite index for per-document lookups on tables created before
+        # it was declared; it supersedes the single-column document_id index
+        await conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_chunks_document_order
+            ON document_chunks (document_id, chunk_index)
+        """))
+        await conn.execute(text("DROP INDEX IF EXISTS ix_document_chunks_document_id"))
+        # Backfill document metadata for chunks ingested before the
+        # documents table existed
+        has_documents = await conn.scalar(text("SELECT EXISTS (SELECT 1 FROM documents)"))
+        if not has_documents:
+            await conn.execute(text("""
+                INSERT INTO documents (id, name, chunk_count, created_at)
+                SELECT document_id, MAX(document_name), COUNT(*), MIN(created_at)
+                FROM document_chunks
+                GROUP BY document_id
+                ON CONFLICT (id) DO NOTHING
+            """))
+        if settings.hnsw_auto_tune:
+            count = await conn.scalar(text("SELECT count(*) FROM document_chunks"))
+            # Applied to searches by the asyncpg pool, created after this
+            hnsw_params.update(configure_hnsw_params(count or 0))
+        # Embeddings are stored as halfvec (FP16); convert tables created
+        # with the original FP32 vector column in place
+        column_type = await conn.scalar(text("""
+            SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = 'document_chunks'::regclass AND attname = 'embedding'
+        """))
+        if column_type == f"vector({dim})":
+            await conn.execute(text("DROP INDEX IF EXISTS idx_chunks_embedding_hnsw"))
+            await conn.execute(text("DROP INDEX IF EXISTS idx_chunks_embedding_ivfflat"))
+            await conn.execute(text(f"""
+                ALTER TABLE document_chunks ALTER COLUMN embedding
+                TYPE halfvec({dim}) USING embedding::halfvec({dim})
+            """))
+        # Vector index for similarity search (HNSW, or IVFFlat for
+        # ingest-heavy deployments); the opclass must match the distance
+        # operator used by the search queries (<#> is inner product)
+        await _set_index_build_params(conn)
+        # Rebuild indexes created with an earlier opclass
+        for index_name in ("idx_chunks_embedding_hnsw", "idx_chunks_embedding_ivfflat"):
+            indexdef = await conn.scalar(
+                text("SELECT indexdef FROM pg_indexes WHERE indexname = :name"),
+                {"name": index_name}
+            )
+            if indexdef and "halfvec_ip_ops" not in indexdef:
+                await conn.execute(text(f"DROP INDEX {index_name}"))
+        if settings.vector_index_type == "ivfflat":
+            await conn.execute(text("DROP INDEX IF EXISTS idx_chunks_embedding_hnsw"))
+            ivfflat_index_pending = not await _build_ivfflat_index(conn)
+        else:
+            await conn.execute(text("DROP INDEX IF EXISTS idx_chunks_embedding_ivfflat"))
+            await conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS idx_chunks_embedding_hnsw
+                ON document_chunks USING hnsw (embedding halfvec_ip_ops)
+                WITH (m = {int(hnsw_params['m'])},
+                      ef_construction = {int(hnsw_params['ef_construction'])})
+            """))
+        # Binary-quantized expression index for the optional prefilter stage
+        if settings.bq_prefilter:
+            await conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS idx_chunks_embedding_bq
+                ON document_chunks
+                USING hnsw ((binary_quantize(embedding)::bit({dim})) bit_hamming_ops)
+            """))
+        else:
+            await conn.execute(text("DROP INDEX IF EXISTS idx_chunks_embedding_bq"))
+    return dict(hnsw_params)
+
+
+async def init_pg_pool() -> asyncpg.Pool:
+    """Create the asyncpg pool used for vector search; call after init_db."""
+    global pg_pool
+    dsn = make_url(settings.database_url).set(drivername="postgresql")
+    pg_pool = await asyncpg.create_pool(
+        dsn.render_as_string(hide_password=False),
+        min_size=settings.pg_pool_min_size,
+        max_size=settings.pg_pool_max_size,
+        statement_cache_size=settings.pg_statement_cache_size,
+        init=register_vector,
+        server_settings=vector_search_settings(),
+    )
+    return pg_pool
+
+
+async def close_pg_pool() -> None:
+    """Close the asyncpg pool."""
+    global pg_pool
+    if pg_pool is not None:
+        await pg_pool.close()
+        pg_pool = None
+
+
+def get_pg_pool() -> asyncpg.Pool:
+    """Get the asyncpg pool, failing if startup has not created it."""
+    if pg_pool is None:
+        raise DatabaseConnectionError(reason="asyncpg pool is not initialized")
+    return pg_pool
 
 
 async def get_session() -> AsyncSession:
-    """Dependency to get database session."""
+    """
+    Dependency to get database session.
+    
+    The session is not committed on exit; endpoints that write commit
+    explicitly so read-only requests skip the COMMIT round-trip.
+    """
     async with async_session() as session:
         try:
             yield session
-            await session.commit()
         except Exception:
             await session.rollback()
             raise
         finally:
             await session.close()
+
+
+async def get_read_session() -> AsyncSession:
+    """Dependency to get an autocommit session for read-only endpoints."""
+    async with read_session() as session:
+        yield session
@@ -3,6 +3,17 @@
 from typing import Any
 
 
+def _restore_exception(
+    cls: type["RAGException"],
+    message: str,
+    details: dict[str, Any]
+) -> "RAGException":
+    """Rebuild an unpickled RAG exception without calling its __init__."""
+    exc = cls.__new__(cls)
+    RAGException.__init__(exc, message, details)
+    return exc
+
+
 class RAGException(Exception):
     """Base exception for RAG application."""
     
@@ -10,6 +21,11 @@ class RAGException(Exception):
         self.message = message
         self.details = details or {}
         super().__init__(self.message)
+    
+    def __reduce__(self):
+        # Subclass __init__ signatures differ, so pickle (e.g. across a
+        # process pool) by state rather than by constructor arguments
+        return (_restore_exception, (type(self), self.message, self.details))
 
 
 class DocumentException(RAGException):
@@ -4,6 +4,7 @@ import logging
 import sys
 from typing import Any
 
+import orjson
 import structlog
 from structlog.types import Processor
 
@@ -18,38 +19,38 @@ def setup_logging(json_logs: bool = True, log_level: str = "INFO") -> None:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     """
     
+    level = getattr(logging, log_level.upper())
+    
     # Shared processors for all environments
     shared_processors: list[Processor] = [
         structlog.contextvars.merge_contextvars,
         structlog.processors.add_log_level,
-        structlog.processors.StackInfoRenderer(),
-        structlog.dev.set_exc_info,
         structlog.processors.TimeStamper(fmt="iso"),
     ]
     
     if json_logs:
-        # Production: JSON output
+        # Production: JSON output rendered by orjson straight to bytes.
+        # logger.exception() already sets exc_info, so set_exc_info and
+        # StackInfoRenderer are left out of the per-call chain.
         structlog.configure(
             processors=shared_processors + [
                 structlog.processors.dict_tracebacks,
-                structlog.processors.JSONRenderer(),
+                structlog.processors.JSONRenderer(serializer=orjson.dumps),
             ],
-            wrapper_class=structlog.make_filtering_bound_logger(
-                getattr(logging, log_level.upper())
-            ),
+            wrapper_class=structlog.make_filtering_bound_logger(level),
             context_class=dict,
-            logger_factory=structlog.PrintLoggerFactory(),
+            logger_factory=structlog.BytesLoggerFactory(),
             cache_logger_on_first_use=True,
         )
     else:
         # Development: Colored console output
         structlog.configure(
             processors=shared_processors + [
+                structlog.processors.StackInfoRenderer(),
+                structlog.dev.set_exc_info,
                 structlog.dev.ConsoleRenderer(colors=True),
             ],
-            wrapper_class=structlog.make_filtering_bound_logger(
-                getattr(logging, log_level.upper())
-            ),
+            wrapper_class=structlog.make_filtering_bound_logger(level),
             context_class=dict,
             logger_factory=structlog.PrintLoggerFactory(),
             cache_logger_on_first_use=True,
@@ -59,7 +60,7 @@ def setup_logging(json_logs: bool = True, log_level: str = "INFO") -> None:
     logging.basicConfig(
         format="%(message)s",
         stream=sys.stdout,
-        level=getattr(logging, log_level.upper()),
+        level=level,
     )
 
 
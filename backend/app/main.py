@@ -1,22 +1,40 @@
 """FastAPI main application for Cloud-Native-RAG backend."""
 
+import itertools
+import multiprocessing
 import os
+from concurrent.futures import Executor, ProcessPoolExecutor
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from prometheus_fastapi_instrumentator import Instrumentator
-import json
 
 from .config import get_settings
-from .database import init_db, get_session
+from .database import (
+    init_db,
+    init_pg_pool,
+    close_pg_pool,
+    cancel_ivfflat_build,
+    get_session,
+    get_read_session,
+)
 from .models import IngestResponse, ChatRequest
-from .services import IngestionService, ChatService
+from .services import IngestionService, ChatService, open_http_client, close_http_client
 from .logging_config import setup_logging, get_logger, bind_context, clear_context
 from .tracing import setup_tracing, instrument_app
 from .exceptions import RAGException
-from .api import router as api_v1_router
+from .middleware import StaticCORSMiddleware, UploadSizeLimitMiddleware
+from .repository import DocumentRepository
+from .api import (
+    router as api_v1_router,
+    ingestion_service as api_ingestion_service,
+    chat_service as api_chat_service,
+    open_upload,
+    sse_event,
+    SSE_DONE,
+    MAX_FILE_SIZE,
+)
 
 settings = get_settings()
 
@@ -35,15 +53,52 @@ setup_tracing(
 )
 
 
+def start_process_pool() -> ProcessPoolExecutor:
+    """
+    Create the ingest process pool.
+    
+    Workers come from a forkserver rather than fork: forking the running
+    server would copy its event loop, connection pools and threads into
+    every worker.
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.ingest_workers,
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+
+
+def replace_process_pool(broken: Executor) -> Executor:
+    """Swap a broken ingest pool for a new one on every holder of it."""
+    if app.state.ppool is broken:
+        logger.warning("Restarting broken ingest process pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        app.state.ppool = start_process_pool()
+        ingestion_service.executor = app.state.ppool
+        api_ingestion_service.executor = app.state.ppool
+    return app.state.ppool
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan: initialize database on startup."""
     logger.info("Starting application", version="1.0.0")
     logger.info("Initializing database...")
-    await init_db()
-    logger.info("Database initialized successfully")
+    hnsw_params = await init_db()
+    logger.info("Database initialized successfully", hnsw=hnsw_params)
+    await init_pg_pool()
+    app.state.ppool = start_process_pool()
+    for service in (ingestion_service, api_ingestion_service):
+        service.executor = app.state.ppool
+        service.replace_executor = replace_process_pool
+    app.state.http_client = open_http_client()
+    for holder in (ingestion_service, api_ingestion_service, chat_service, api_chat_service):
+        holder.embedding_service.client = app.state.http_client
     yield
     logger.info("Shutting down application...")
+    app.state.ppool.shutdown(wait=False, cancel_futures=True)
+    await cancel_ivfflat_build()
+    await close_pg_pool()
+    await close_http_client()
 
 
 app = FastAPI(
@@ -55,23 +110,37 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
-# Configure CORS to allow all origins
-# NOTE: For production, restrict this to specific domains
+# Upload endpoints and the largest request body they accept; the headroom
+# covers multipart framing around the file itself
+_UPLOAD_PATHS = frozenset({"/api/v1/ingest", "/api/ingest"})
+MAX_UPLOAD_REQUEST_SIZE = MAX_FILE_SIZE + 1024 * 1024
+
+# Added before CORS so that 413 responses still carry the CORS header
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # TODO: Restrict for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    UploadSizeLimitMiddleware,
+    paths=_UPLOAD_PATHS,
+    max_size=MAX_UPLOAD_REQUEST_SIZE,
+    detail="File size exceeds 50MB limit",
 )
 
+# Configure CORS to allow all origins
+# NOTE: For production, restrict this to specific domains
+app.add_middleware(StaticCORSMiddleware)  # TODO: Restrict for production
+
+
+# Process-unique request IDs without a urandom syscall per request
+_request_prefix = f"{os.getpid():x}-"
+_request_counter = itertools.count()
+
 
 # Request context middleware
 @app.middleware("http")
 async def add_request_context(request: Request, call_next):
     """Add request context to logs."""
-    import uuid
-    request_id = str(uuid.uuid4())[:8]
+    request_id = (
+        request.headers.get("x-request-id")
+        or f"{_request_prefix}{next(_request_counter):08x}"
+    )
     bind_context(request_id=request_id)
     
     logger.info(
@@ -113,10 +182,10 @@ instrumentator = Instrumentator(
     should_group_status_codes=True,
     should_ignore_untemplated=True,
     should_respect_env_var=True,
-    should_instrument_requests_inprogress=True,
-    excluded_handlers=["/metrics", "/health", "/ready"],
-    inprogress_name="http_requests_inprogress",
-    inprogress_labels=True,
+    # In-progress gauges take a labeled-gauge lock on every request start
+    # and end; leave them off on the hot path
+    should_instrument_requests_inprogress=False,
+    excluded_handlers=["/metrics", "/health", "/ready", "/docs", "/redoc", "/openapi.json"],
 )
 instrumentator.instrument(app).expose(app, endpoint="/metrics")
 
@@ -139,7 +208,7 @@ async def health_check():
 
 
 @app.get("/ready")
-async def readiness_check(session: AsyncSession = Depends(get_session)):
+async def readiness_check(session: AsyncSession = Depends(get_read_session)):
     """Readiness check - verifies database connection."""
     try:
         from sqlalchemy import text
@@ -167,15 +236,9 @@ async def ingest_document_legacy(
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
+    content, _ = open_upload(file)
+    
     try:
-        content = await file.read()
-        
-        if len(content) == 0:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
-        
-        if len(content) > 50 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
-        
         document_id, chunks_created = await ingestion_service.ingest_document(
             filename=file.filename,
             file_content=content,
@@ -198,10 +261,7 @@ async def ingest_document_legacy(
 
 
 @app.post("/api/chat", deprecated=True)
-async def chat_legacy(
-    request: ChatRequest,
-    session: AsyncSession = Depends(get_session)
-):
+async def chat_legacy(request: ChatRequest):
     """
     [DEPRECATED] Use /api/v1/chat instead.
     
@@ -211,13 +271,10 @@ async def chat_legacy(
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
     try:
-        query_embedding = await chat_service.embedding_service.get_embedding(
-            request.message
-        )
+        query_embedding = await chat_service.embed_query(request.message)
         
         relevant_chunks = await chat_service.similarity_search(
             query_embedding=query_embedding,
-            session=session,
             top_k=5
         )
         
@@ -228,17 +285,17 @@ async def chat_legacy(
             history = [{"role": m.role, "content": m.content} for m in request.history]
         
         async def generate():
-            sources = list(set(chunk.document_name for chunk in relevant_chunks))
-            yield f"data: {json.dumps({'type': 'sources', 'data': sources})}\n\n"
+            sources = list(dict.fromkeys(chunk.document_name for chunk in relevant_chunks))
+            yield sse_event({"type": "sources", "data": sources})
             
             async for chunk in chat_service.stream_chat_response(
                 message=request.message,
                 context=context,
                 history=history
             ):
-                yield f"data: {json.dumps({'type': 'content', 'data': chunk})}\n\n"
+                yield sse_event({"type": "content", "data": chunk})
             
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield SSE_DONE
         
         return StreamingResponse(
             generate(),
@@ -256,29 +313,10 @@ async def chat_legacy(
 
 
 @app.get("/api/documents", deprecated=True)
-async def list_documents_legacy(session: AsyncSession = Depends(get_session)):
+async def list_documents_legacy(session: AsyncSession = Depends(get_read_session)):
     """[DEPRECATED] Use /api/v1/documents instead."""
     try:
-        from sqlalchemy import text
-        result = await session.execute(
-            text("""
-                SELECT DISTINCT document_id, document_name, 
-                       MIN(created_at) as created_at,
-                       COUNT(*) as chunk_count
-                FROM document_chunks
-                GROUP BY document_id, document_name
-                ORDER BY MIN(created_at) DESC
-            """)
-        )
-        
-        documents = []
-        for row in result.fetchall():
-            documents.append({
-                "id": row.document_id,
-                "name": row.document_name,
-                "created_at": row.created_at.isoformat() if row.created_at else None,
-                "chunks": row.chunk_count
-            })
+        documents = await DocumentRepository(session).list_documents()
         
         return {"documents": documents, "total": len(documents)}
         
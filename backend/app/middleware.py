@@ -0,0 +1,98 @@
+"""ASGI middleware for the RAG application."""
+
+from typing import Iterable
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+_ALLOW_ORIGIN = (b"access-control-allow-origin", b"*")
+
+
+def _is_preflight(scope: Scope) -> bool:
+    """Whether an OPTIONS request is a CORS preflight rather than a plain one."""
+    names = {name for name, _ in scope["headers"]}
+    return b"origin" in names and b"access-control-request-method" in names
+
+
+class StaticCORSMiddleware:
+    """
+    CORS for a public API that allows every origin.
+    
+    Response headers are precomputed, so simple requests only get one
+    header appended and preflight requests are answered directly, with no
+    per-request origin, method or header matching. Other OPTIONS requests
+    reach the app, which answers them like any other method.
+    """
+    
+    def __init__(self, app: ASGIApp, max_age: int = 600):
+        self.app = app
+        self.preflight_headers = [
+            _ALLOW_ORIGIN,
+            (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+            (b"access-control-allow-headers", b"*"),
+            (b"access-control-max-age", str(max_age).encode()),
+            (b"content-length", b"0"),
+        ]
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        if scope["method"] == "OPTIONS" and _is_preflight(scope):
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": self.preflight_headers,
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        async def send_with_cors(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), _ALLOW_ORIGIN]
+            await send(message)
+        
+        await self.app(scope, receive, send_with_cors)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject uploads by Content-Length before their body is read and spooled.
+    
+    Only requests to the given paths have their headers inspected; all
+    other traffic, including streamed chat responses, passes straight
+    through.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        paths: Iterable[str],
+        max_size: int,
+        detail: str = "Request body too large"
+    ):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_size = max_size
+        self.body = orjson.dumps({"detail": detail})
+        self.headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(self.body)).encode()),
+        ]
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_size:
+                        await send({
+                            "type": "http.response.start",
+                            "status": 413,
+                            "headers": self.headers,
+                        })
+                        await send({"type": "http.response.body", "body": self.body})
+                        return
+                    break
+        
+        await self.app(scope, receive, send)
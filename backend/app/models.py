@@ -1,29 +1,36 @@
 """Database models for Cloud-Native-RAG using SQLModel and pgvector."""
 
 from datetime import datetime
-from typing import Optional
+from typing import NamedTuple, Optional
 from sqlmodel import Field, SQLModel
-from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, Text
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import Column, Index, Text
 import uuid
 
+# pgvector's binary halfvec element layout: big-endian IEEE float16
+HALFVEC_DTYPE = ">f2"
+
 
 class DocumentChunk(SQLModel, table=True):
     """Model for storing document chunks with vector embeddings."""
     
     __tablename__ = "document_chunks"
+    # Serves chunk listing in order and per-document deletes
+    __table_args__ = (
+        Index("idx_chunks_document_order", "document_id", "chunk_index"),
+    )
     
     id: str = Field(
         default_factory=lambda: str(uuid.uuid4()),
         primary_key=True,
         index=True
     )
-    document_id: str = Field(index=True)
+    document_id: str
     document_name: str = Field(max_length=500)
     content: str = Field(sa_column=Column(Text))
     chunk_index: int = Field(default=0)
     embedding: list[float] = Field(
-        sa_column=Column(Vector(1536))
+        sa_column=Column(HALFVEC(1536))
     )
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -31,6 +38,28 @@ class DocumentChunk(SQLModel, table=True):
         arbitrary_types_allowed = True
 
 
+class ChunkHit(NamedTuple):
+    """Similarity search result: the chunk columns callers read, no ORM."""
+    
+    id: str
+    document_id: str
+    document_name: str
+    content: str
+    chunk_index: int
+    distance: float
+
+
+class Document(SQLModel, table=True):
+    """Model for per-document metadata, written alongside its chunks."""
+    
+    __tablename__ = "documents"
+    
+    id: str = Field(primary_key=True)
+    name: str = Field(max_length=500)
+    chunk_count: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
 class ChatMessage(SQLModel):
     """Model for chat messages (not persisted)."""
     
@@ -1,16 +1,133 @@
 """Repository pattern for data access layer."""
 
+from functools import lru_cache
 from typing import Sequence
+
+import asyncpg
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text, delete
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import load_only, selectinload
 
-from .models import DocumentChunk
+from .batching import MicroBatcher
+from .config import get_settings
+from .database import get_pg_pool, hnsw_params
+from .models import ChunkHit, Document, DocumentChunk
 from .logging_config import get_logger
 
+settings = get_settings()
 logger = get_logger(__name__)
 
 
+# pgvector's default hnsw.ef_search, in effect when the main index is IVFFlat
+_DEFAULT_EF_SEARCH = 40
+
+
+@lru_cache(maxsize=None)
+def _nearest_chunks_sql(query_count: int, bq_prefilter: bool = False) -> str:
+    """
+    Build the k-NN query for query_count vectors as one LATERAL join.
+    
+    Embeddings are unit-normalized, so ranking uses negative inner product
+    (<#>), which the index serves; distance is reported as 1 - similarity.
+    Each query carries an optional maximum distance, applied in SQL.
+    
+    With bq_prefilter, candidates are first taken by Hamming distance over
+    binary-quantized embeddings (bit index) and then reranked exactly.
+    """
+    queries = ", ".join(
+        f"(${i + 1}::halfvec, {i}, ${query_count + i + 1}::float8)"
+        for i in range(query_count)
+    )
+    if bq_prefilter:
+        dim = int(settings.embedding_dimension)
+        source = f"""(
+                SELECT * FROM document_chunks
+                ORDER BY binary_quantize(embedding)::bit({dim})
+                    <~> binary_quantize(q.embedding)
+                LIMIT ${2 * query_count + 2}
+            )"""
+    else:
+        source = "document_chunks"
+    return f"""
+        SELECT q.idx, r.*
+        FROM (VALUES {queries}) AS q(embedding, idx, max_distance)
+        CROSS JOIN LATERAL (
+            SELECT 
+                c.id, c.document_id, c.document_name, c.content, 
+                c.chunk_index,
+                1 + (c.embedding <#> q.embedding) AS distance
+            FROM {source} c
+            WHERE q.max_distance IS NULL
+               OR 1 + (c.embedding <#> q.embedding) <= q.max_distance
+            ORDER BY c.embedding <#> q.embedding
+            LIMIT ${2 * query_count + 1}
+        ) r
+        ORDER BY q.idx, r.distance
+    """
+
+
+async def fetch_nearest_chunks(
+    query_embeddings: list[list[float]],
+    top_k: int,
+    max_distances: list[float | None] | None = None
+) -> list[list[asyncpg.Record]]:
+    """
+    Fetch the top_k nearest chunks for each query vector in one round-trip.
+    
+    Runs on the raw asyncpg pool with the binary pgvector codec, no ORM.
+    
+    Args:
+        query_embeddings: Query vectors
+        top_k: Number of results per query
+        max_distances: Optional per-query distance cutoff (None: no cutoff)
+    
+    Returns:
+        One list of rows per query embedding, ordered by distance
+    """
+    if max_distances is None:
+        max_distances = [None] * len(query_embeddings)
+    sql = _nearest_chunks_sql(len(query_embeddings), settings.bq_prefilter)
+    args = [*query_embeddings, *max_distances, top_k]
+    
+    # Rows the HNSW scan must produce, and the ef_search it runs with
+    if settings.bq_prefilter:
+        scan_limit = max(settings.bq_rerank_candidates, top_k)
+        args.append(scan_limit)
+    elif settings.vector_index_type == "hnsw":
+        scan_limit = top_k
+    else:
+        scan_limit = 0
+    if settings.vector_index_type == "hnsw":
+        ef_search = hnsw_params["ef_search"]
+    else:
+        ef_search = _DEFAULT_EF_SEARCH
+    
+    async with get_pg_pool().acquire() as conn:
+        if scan_limit > ef_search:
+            # HNSW returns at most ef_search rows per scan; widen the
+            # candidate list for this query only
+            async with conn.transaction():
+                await conn.execute(
+                    "SELECT set_config('hnsw.ef_search', $1, true)",
+                    str(scan_limit),
+                )
+                rows = await conn.fetch(sql, *args)
+        else:
+            rows = await conn.fetch(sql, *args)
+    
+    results: list[list[asyncpg.Record]] = [[] for _ in query_embeddings]
+    for row in rows:
+        results[row["idx"]].append(row)
+    return results
+
+
+def rows_to_hits(rows: list[asyncpg.Record]) -> list[ChunkHit]:
+    """Convert search rows to ChunkHit tuples."""
+    # Rows are (idx, *ChunkHit fields) in order; slice instead of looking
+    # up each column by name
+    return [ChunkHit._make(row[1:]) for row in rows]
+
+
 class DocumentRepository:
     """Repository for document chunk operations."""
     
@@ -39,6 +156,59 @@ class DocumentRepository:
         )
         return len(chunks)
     
+    async def bulk_copy_chunks(
+        self,
+        chunks: list[DocumentChunk],
+        document: Document
+    ) -> int:
+        """
+        Bulk-load chunks with COPY and record their document, atomically.
+        
+        Runs on the asyncpg pool, whose pgvector codec lets COPY send the
+        embeddings in binary, instead of one INSERT per chunk through the
+        session.
+        """
+        records = [
+            (
+                chunk.id,
+                chunk.document_id,
+                chunk.document_name,
+                chunk.content,
+                chunk.chunk_index,
+                chunk.created_at,
+                chunk.embedding,
+            )
+            for chunk in chunks
+        ]
+        
+        async with get_pg_pool().acquire() as conn:
+            async with conn.transaction():
+                await conn.copy_records_to_table(
+                    "document_chunks",
+                    records=records,
+                    columns=[
+                        "id", "document_id", "document_name", "content",
+                        "chunk_index", "created_at", "embedding",
+                    ],
+                )
+                await conn.execute(
+                    """
+                    INSERT INTO documents (id, name, chunk_count, created_at)
+                    VALUES ($1, $2, $3, $4)
+                    """,
+                    document.id,
+                    document.name,
+                    document.chunk_count,
+                    document.created_at,
+                )
+        
+        logger.info(
+            "Copied document chunks",
+            count=len(records),
+            document_id=document.id
+        )
+        return len(records)
+    
     async def get_chunk_by_id(self, chunk_id: str) -> DocumentChunk | None:
         """Get a document chunk by ID."""
         result = await self.session.execute(
@@ -50,9 +220,22 @@ class DocumentRepository:
         self, 
         document_id: str
     ) -> Sequence[DocumentChunk]:
-        """Get all chunks for a document."""
+        """
+        Get all chunks for a document, without their embeddings.
+        
+        The embedding column is left unloaded; it is most of each row's size
+        and listing chunks does not need it.
+        """
         result = await self.session.execute(
             select(DocumentChunk)
+            .options(load_only(
+                DocumentChunk.id,
+                DocumentChunk.document_id,
+                DocumentChunk.document_name,
+                DocumentChunk.content,
+                DocumentChunk.chunk_index,
+                DocumentChunk.created_at,
+            ))
             .where(DocumentChunk.document_id == document_id)
             .order_by(DocumentChunk.chunk_index)
         )
@@ -65,6 +248,9 @@ class DocumentRepository:
             .where(DocumentChunk.document_id == document_id)
         )
         deleted_count = result.rowcount
+        await self.session.execute(
+            delete(Document).where(Document.id == document_id)
+        )
         logger.info(
             "Deleted document chunks",
             document_id=document_id,
@@ -77,85 +263,51 @@ class DocumentRepository:
         query_embedding: list[float],
         top_k: int = 5,
         score_threshold: float | None = None
-    ) -> list[tuple[DocumentChunk, float]]:
+    ) -> list[ChunkHit]:
         """
         Find most similar document chunks using pgvector.
         
         Args:
             query_embedding: Query vector
             top_k: Number of results to return
-            score_threshold: Optional minimum similarity score
+            score_threshold: Optional maximum distance to include
             
         Returns:
-            List of (chunk, distance) tuples ordered by similarity
+            List of hits (chunk fields and distance) ordered by similarity
         """
-        embedding_str = f"[{','.join(map(str, query_embedding))}]"
-        
-        # Use parameterized query with pgvector distance operator
-        query = text("""
-            SELECT 
-                id, document_id, document_name, content, 
-                chunk_index, created_at,
-                embedding <-> :embedding::vector AS distance
-            FROM document_chunks
-            ORDER BY distance
-            LIMIT :limit
-        """)
-        
-        result = await self.session.execute(
-            query, 
-            {"embedding": embedding_str, "limit": top_k}
-        )
-        
-        rows = result.fetchall()
-        
-        chunks_with_scores = []
-        for row in rows:
-            # Skip if below threshold
-            if score_threshold and row.distance > score_threshold:
-                continue
-                
-            chunk = DocumentChunk(
-                id=row.id,
-                document_id=row.document_id,
-                document_name=row.document_name,
-                content=row.content,
-                chunk_index=row.chunk_index,
-                created_at=row.created_at,
-                embedding=[]  # Don't return embeddings
-            )
-            chunks_with_scores.append((chunk, row.distance))
+        # The threshold is applied in SQL, so filtered rows are never sent
+        rows = (await fetch_nearest_chunks(
+            [query_embedding], top_k, [score_threshold]
+        ))[0]
+        hits = rows_to_hits(rows)
         
         logger.debug(
             "Similarity search completed",
-            results_count=len(chunks_with_scores),
+            results_count=len(hits),
             top_k=top_k
         )
         
-        return chunks_with_scores
+        return hits
     
     async def list_documents(self) -> list[dict]:
         """List all unique documents with metadata."""
+        # Plain columns: no ORM identity-map work for a read-only listing
         result = await self.session.execute(
-            text("""
-                SELECT DISTINCT 
-                    document_id, 
-                    document_name, 
-                    MIN(created_at) as created_at,
-                    COUNT(*) as chunk_count
-                FROM document_chunks
-                GROUP BY document_id, document_name
-                ORDER BY MIN(created_at) DESC
-            """)
+            select(
+                Document.id,
+                Document.name,
+                Document.created_at,
+                Document.chunk_count,
+            ).order_by(Document.created_at.desc())
         )
         
         documents = []
-        for row in result.fetchall():
+        for id_, name, created_at, chunk_count in result:
             documents.append({
-                "id": row.document_id,
-                "name": row.document_name,
-                "created_at": row.created_at.isoformat() if row.created_at else None,
-                "chunks": row.chunk_count
+                "id": id_,
+                "name": name,
+                "created_at": created_at.isoformat() if created_at else None,
+                "chunks": chunk_count
             })
         
         return documents
@@ -163,7 +315,7 @@ class DocumentRepository:
     async def count_documents(self) -> int:
         """Count total unique documents."""
         result = await self.session.execute(
-            text("SELECT COUNT(DISTINCT document_id) FROM document_chunks")
+            text("SELECT COUNT(*) FROM documents")
         )
         return result.scalar() or 0
     
@@ -173,3 +325,49 @@ class DocumentRepository:
             text("SELECT COUNT(*) FROM document_chunks")
         )
         return result.scalar() or 0
+
+
+class BatchedSimilaritySearch:
+    """
+    Similarity search that coalesces concurrent queries.
+    
+    Searches arriving within a short window are answered by a single
+    LATERAL query over all query vectors, so concurrent chats share one
+    database round-trip instead of each issuing its own.
+    """
+    
+    def __init__(
+        self,
+        max_batch_size: int = settings.similarity_batch_max_size,
+        max_wait_ms: float = settings.similarity_batch_wait_ms
+    ):
+        self.batcher = MicroBatcher(
+            self._search_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+        )
+    
+    async def similarity_search(
+        self,
+        query_embedding: list[float],
+        top_k: int = 5,
+        score_threshold: float | None = None
+    ) -> list[ChunkHit]:
+        """Find most similar document chunks; see DocumentRepository.similarity_search."""
+        rows = await self.batcher.submit(
+            (query_embedding, top_k, score_threshold)
+        )
+        return rows_to_hits(rows)
+    
+    async def _search_batch(
+        self,
+        queries: list[tuple[list[float], int, float | None]]
+    ) -> list[list[asyncpg.Record]]:
+        """Run one search for a batch, trimming each result to its own top_k."""
+        top_k = max(k for _, k, _ in queries)
+        results = await fetch_nearest_chunks(
+            [q for q, _, _ in queries],
+            top_k,
+            [max_distance for _, _, max_distance in queries],
+        )
+        return [rows[:k] for rows, (_, k, _) in zip(results, queries)]
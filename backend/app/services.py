@@ -1,13 +1,28 @@
 """Services for PDF processing, embeddings, and RAG chat with resilience patterns."""
 
+import asyncio
+import hashlib
 import io
-import json
+import os
+import re
+import shutil
+import tempfile
+import time
 import uuid
-from typing import AsyncIterator
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, Iterator, Protocol
 import httpx
+import numpy as np
+import orjson
+import pypdfium2 as pdfium
 from PyPDF2 import PdfReader
+try:
+    # Optional faster backend; AGPL-licensed, so not a pinned requirement
+    import fitz
+except ImportError:
+    fitz = None
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -16,8 +31,12 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .models import DocumentChunk
+from .batching import MicroBatcher
+from .cache import LRUCache
+from .models import HALFVEC_DTYPE, ChunkHit, Document, DocumentChunk
+from .repository import DocumentRepository, rows_to_hits, fetch_nearest_chunks
 from .config import get_settings
+from .database import schedule_ivfflat_index
 from .logging_config import get_logger
 from .exceptions import (
     DocumentExtractionError,
@@ -30,14 +49,74 @@ settings = get_settings()
 logger = get_logger(__name__)
 
 
+# One pooled client for all OpenRouter calls, so connections and TLS
+# sessions are reused across services; HTTP/2 multiplexes concurrent
+# requests over a single connection. Opened on startup and injected into
+# the services, closed on shutdown.
+http_client: httpx.AsyncClient | None = None
+
+
+def open_http_client() -> httpx.AsyncClient:
+    """
+    Create the shared OpenRouter client (on startup).
+    
+    Each startup gets a new client, so an app started again in the same
+    process never reuses the one its previous shutdown closed.
+    """
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=60.0,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+        http2=True,
+    )
+    return http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared OpenRouter client (on shutdown)."""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared client, opening it for services used outside the app."""
+    if http_client is None or http_client.is_closed:
+        return open_http_client()
+    return http_client
+
+# Embeddings by content hash, shared by all EmbeddingService instances;
+# they are deterministic for the configured model
+_embedding_cache: LRUCache[bytes, np.ndarray] = LRUCache(settings.embedding_cache_size)
+
+
+def _embedding_key(text: str) -> bytes:
+    """Key of a text in the embedding cache."""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
 class EmbeddingService:
     """Service for generating embeddings via OpenRouter with retry logic."""
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=60.0)
+    def __init__(self, client: httpx.AsyncClient | None = None):
+        # Injected on startup; until then the shared client is used
+        self._client = client
         self.api_key = settings.openrouter_api_key
         self.base_url = settings.openrouter_base_url
     
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The injected HTTP client, else the shared one."""
+        return self._client or get_http_client()
+    
+    @client.setter
+    def client(self, client: httpx.AsyncClient) -> None:
+        self._client = client
+    
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=30),
@@ -53,10 +132,10 @@ class EmbeddingService:
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
                 },
-                json={
+                content=orjson.dumps({
                     "model": settings.embedding_model,
                     "input": text
-                }
+                })
             )
             
             if response.status_code == 429:
@@ -65,7 +144,7 @@ class EmbeddingService:
                 raise LLMRateLimitError(retry_after=retry_after)
             
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             logger.debug("Generated embedding", text_length=len(text))
             return data["data"][0]["embedding"]
@@ -80,7 +159,7 @@ class EmbeddingService:
         retry=retry_if_exception_type((httpx.HTTPError, httpx.TimeoutException)),
         before_sleep=before_sleep_log(logger, "WARNING"),
     )
-    async def get_embeddings_batch(self, texts: list[str]) -> list[list[float]]:
+    async def _request_embeddings(self, texts: list[str]) -> list[list[float]]:
         """Generate embeddings for multiple texts with retry."""
         try:
             logger.info("Generating batch embeddings", count=len(texts))
@@ -91,10 +170,10 @@ class EmbeddingService:
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
                 },
-                json={
+                content=orjson.dumps({
                     "model": settings.embedding_model,
                     "input": texts
-                }
+                })
             )
             
             if response.status_code == 429:
@@ -102,7 +181,7 @@ class EmbeddingService:
                 raise LLMRateLimitError(retry_after=retry_after)
             
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
             embeddings = [item["embedding"] for item in data["data"]]
             logger.info("Batch embeddings generated", count=len(embeddings))
@@ -112,142 +191,753 @@ class EmbeddingService:
             logger.error("Batch embedding API error", error=str(e))
             raise EmbeddingGenerationError(reason=str(e))
     
+    async def get_embeddings_batch(self, texts: list[str]) -> list[list[float]]:
+        """
+        Generate embeddings for multiple texts, reusing cached results.
+        
+        Only texts not seen before (by content hash) are sent to the API,
+        each once, so re-ingesting a document costs no API calls.
+        """
+        keys = [_embedding_key(text) for text in texts]
+        embeddings = [_embedding_cache.get(key) for key in keys]
+        
+        missing = {
+            key: text
+            for key, text, embedding in zip(keys, texts, embeddings)
+            if embedding is None
+        }
+        if missing:
+            fetched = await self._request_embeddings(list(missing.values()))
+            for key, embedding in zip(missing, fetched):
+                # float32 arrays take a fraction of the memory of float lists
+                _embedding_cache.set(key, np.asarray(embedding, dtype=np.float32))
+            fetched_by_key = dict(zip(missing, fetched))
+        else:
+            fetched_by_key = {}
+        
+        logger.debug(
+            "Embedding cache lookup",
+            count=len(texts),
+            hits=len(texts) - len(missing)
+        )
+        return [
+            embedding.tolist() if embedding is not None else fetched_by_key[key]
+            for key, embedding in zip(keys, embeddings)
+        ]
+    
     async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+        """Close the HTTP client, unless it is the shared one."""
+        if self._client is not None and self._client is not http_client:
+            await self._client.aclose()
+
+
+# Extracted page texts by PDF content hash (per process: each ingest
+# worker keeps its own)
+_page_text_cache: LRUCache[bytes, list[str]] = LRUCache(settings.pdf_text_cache_size)
+
+
+def _content_digest(file_content: bytes | BinaryIO) -> bytes:
+    """Hash a PDF's content without copying it whole, rewinding file objects."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(file_content, bytes):
+        digest.update(file_content)
+    else:
+        for block in iter(lambda: file_content.read(1 << 16), b""):
+            digest.update(block)
+        file_content.seek(0)
+    return digest.digest()
+
+
+def _has_pdf_header(file_content: bytes | BinaryIO) -> bool:
+    """Check for the %PDF- header, which readers accept in the first 1 KiB."""
+    if isinstance(file_content, bytes):
+        return file_content.find(b"%PDF-", 0, 1024) != -1
+    head = file_content.read(1024)
+    file_content.seek(0)
+    return b"%PDF-" in head
+
+
+def _backing_path(file_content: bytes | BinaryIO) -> str | None:
+    """
+    Path a native parser can open for a file object, or None for bytes and
+    streams held in memory. Unnamed temporary files (such as a spooled
+    upload rolled over to disk) are reached through their descriptor.
+    """
+    name = getattr(file_content, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    if isinstance(name, int) and os.path.isdir("/proc/self/fd"):
+        return f"/proc/self/fd/{name}"
+    return None
+
+
+def _pymupdf_page_texts(
+    doc: "fitz.Document",
+    start: int | None = None,
+    stop: int | None = None
+) -> Iterator[str]:
+    """Yield each page's text via PyMuPDF, closing the document afterwards."""
+    try:
+        for page in doc.pages(start, stop):
+            # Every line, including the last, ends with a newline
+            yield page.get_text("text").rstrip("\n")
+    finally:
+        doc.close()
+
+
+def _pdfium_page_texts(
+    pdf: pdfium.PdfDocument,
+    start: int | None = None,
+    stop: int | None = None
+) -> Iterator[str]:
+    """Yield each page's text via PDFium, closing the document afterwards."""
+    try:
+        for index in range(*slice(start, stop).indices(len(pdf))):
+            page = pdf[index]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    # PDFium ends lines with CRLF, but can also emit a lone
+                    # CR; chunk boundaries expect LF
+                    text = textpage.get_text_bounded()
+                    text = text.replace("\r\n", "\n").replace("\r", "\n")
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+            yield text
+    finally:
+        pdf.close()
+
+
+def _page_range_texts(path: str, start: int, stop: int) -> str:
+    """
+    Extract pages [start, stop) of a spooled PDF with the native parser.
+    
+    Worker task: the non-empty page texts are written as JSON lines to a
+    file next to the PDF, whose path is returned, so they are not sent
+    back through the parent. Cached like extract_pages, per page range.
+    """
+    with open(path, "rb") as f:
+        key = _content_digest(f) + b"%d:%d" % (start, stop)
+    
+    texts = _page_text_cache.get(key)
+    if texts is None:
+        if fitz is not None:
+            page_texts = _pymupdf_page_texts(fitz.open(path), start, stop)
+        else:
+            page_texts = _pdfium_page_texts(pdfium.PdfDocument(path), start, stop)
+        texts = [text for text in _time_bounded(page_texts) if text]
+        if sum(map(len, texts)) <= settings.pdf_text_cache_max_chars:
+            _page_text_cache.set(key, texts)
+    
+    pages_path = f"{path}.{start}.jsonl"
+    with open(pages_path, "wb") as f:
+        for text in texts:
+            f.write(orjson.dumps(text) + b"\n")
+    return pages_path
+
+
+def _read_page_files(paths: list[str]) -> Iterator[str]:
+    """Yield the page texts written by _page_range_texts, in order."""
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                yield orjson.loads(line)
+
+
+def _pypdf2_page_texts(file_content: BinaryIO) -> Iterator[str]:
+    """Yield each page's text via PyPDF2 (pure Python fallback)."""
+    # Non-strict: recover from malformed files instead of raising
+    for page in PdfReader(file_content, strict=False).pages:
+        yield page.extract_text()
+
+
+def _time_bounded(page_texts: Iterator[str]) -> Iterator[str]:
+    """
+    Yield page texts, giving up on a document with a pathological page.
+    
+    Raises TimeoutError once extracting a single page has taken longer
+    than pdf_page_timeout_seconds. Time spent by the consumer between
+    pages is not counted.
+    """
+    limit = settings.pdf_page_timeout_seconds
+    while True:
+        started = time.perf_counter()
+        text = next(page_texts, None)
+        if text is None:
+            return
+        if time.perf_counter() - started > limit:
+            raise TimeoutError(f"a page took longer than {limit:g}s to extract")
+        yield text
 
 
 class PDFService:
     """Service for PDF text extraction."""
     
     @staticmethod
-    def extract_text(file_content: bytes, filename: str = "unknown.pdf") -> str:
-        """Extract text from PDF bytes."""
+    def extract_text(
+        file_content: bytes | BinaryIO,
+        filename: str = "unknown.pdf"
+    ) -> str:
+        """Extract text from PDF bytes or a seekable binary file."""
+        return "\n\n".join(PDFService.extract_pages(file_content, filename))
+    
+    @staticmethod
+    def page_count(path: str) -> int:
+        """Return the page count of a PDF file reported by the native parser."""
+        if fitz is not None:
+            with fitz.open(path) as doc:
+                return doc.page_count
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    
+    @staticmethod
+    def extract_pages(
+        file_content: bytes | BinaryIO,
+        filename: str = "unknown.pdf"
+    ) -> Iterator[str]:
+        """
+        Yield the text of each non-empty PDF page as it is extracted.
+        
+        Uses PyMuPDF when installed, else PDFium (both native code); files
+        the native parser cannot open are retried with PyPDF2.
+        """
+        # Reject non-PDF input before any parser is constructed
+        if not _has_pdf_header(file_content):
+            logger.warning("Rejected file without a PDF header", filename=filename)
+            raise DocumentExtractionError(filename=filename, reason="not a PDF file")
+        
         try:
-            pdf_file = io.BytesIO(file_content)
-            reader = PdfReader(pdf_file)
-            text_parts = []
+            # Identical uploads reuse the text extracted the first time
+            digest = _content_digest(file_content)
+            cached = _page_text_cache.get(digest)
+            if cached is not None:
+                logger.info(
+                    "Reusing extracted PDF text",
+                    filename=filename,
+                    pages=len(cached)
+                )
+                yield from cached
+                return
             
-            for page_num, page in enumerate(reader.pages):
-                text = page.extract_text()
+            try:
+                if fitz is not None:
+                    # Files are opened by path so PyMuPDF does not need their
+                    # bytes in memory; only in-memory streams are read
+                    path = _backing_path(file_content)
+                    if path is not None:
+                        doc = fitz.open(path, filetype="pdf")
+                    else:
+                        if not isinstance(file_content, bytes):
+                            file_content = file_content.read()
+                        doc = fitz.open(stream=file_content, filetype="pdf")
+                    page_texts = _pymupdf_page_texts(doc)
+                else:
+                    page_texts = _pdfium_page_texts(pdfium.PdfDocument(file_content))
+            except Exception as e:
+                logger.warning(
+                    "Native parser could not open PDF, falling back to PyPDF2",
+                    filename=filename,
+                    error=str(e)
+                )
+                if isinstance(file_content, bytes):
+                    file_content = io.BytesIO(file_content)
+                else:
+                    file_content.seek(0)
+                page_texts = _pypdf2_page_texts(file_content)
+            
+            pages = 0
+            characters = 0
+            # Pages are kept for the cache only up to a size limit, so large
+            # documents still stream without holding their full text
+            extracted: list[str] | None = []
+            for text in _time_bounded(page_texts):
+                pages += 1
                 if text:
-                    text_parts.append(text)
-                    
-            extracted = "\n\n".join(text_parts)
+                    characters += len(text)
+                    if extracted is not None:
+                        if characters <= settings.pdf_text_cache_max_chars:
+                            extracted.append(text)
+                        else:
+                            extracted = None
+                    yield text
+            if extracted is not None:
+                _page_text_cache.set(digest, extracted)
+            
             logger.info(
                 "Extracted text from PDF",
                 filename=filename,
-                pages=len(reader.pages),
-                characters=len(extracted)
+                pages=pages,
+                characters=characters
             )
             
-            return extracted
-            
         except Exception as e:
             logger.error("PDF extraction failed", filename=filename, error=str(e))
             raise DocumentExtractionError(filename=filename, reason=str(e))
 
 
+# Sentence endings in break priority order
+_SENTENCE_SEPARATORS = (". ", ".\n", "? ", "!\n", "\n\n")
+_SEPARATOR_RE = re.compile("|".join(re.escape(sep) for sep in _SENTENCE_SEPARATORS))
+
+
+def _find_break(text: str, min_break: int, end: int) -> int:
+    """
+    Return where a chunk ending at most at end should break.
+    
+    Takes the last occurrence, starting at or after min_break, of the
+    highest-priority separator that has one, and breaks after it;
+    otherwise returns end. The bounded str.rfind scans run in C and copy
+    nothing.
+    """
+    for sep in _SENTENCE_SEPARATORS:
+        position = text.rfind(sep, min_break, end)
+        if position != -1:
+            return position + len(sep)
+    return end
+
+
+def _words_cut(text: str, start: int, end: int, words: int) -> int:
+    """
+    Return where the last `words` words of text[start:end] begin.
+    
+    That is the whitespace before them. A word split by start counts as
+    the first word and is never handed on, so when the span holds no more
+    words than that, the cut falls right after it.
+    """
+    span = text[start:end]
+    head = span.rsplit(None, words)
+    if len(head) > words:
+        return start + len(head[0])
+    if start > 0 and span and not (text[start - 1].isspace() or span[0].isspace()):
+        return start + len(span.split(None, 1)[0])
+    return start
+
+
+class Tokenizer(Protocol):
+    """Anything that encodes text to token IDs (e.g. tiktoken, HF tokenizers)."""
+    
+    def encode(self, text: str) -> list[int]: ...
+
+
+# split_text results by (text, chunk_size, chunk_overlap, min_words_cut);
+# str hashes are cached on the object, so repeat lookups are cheap
+_split_cache: LRUCache[tuple[str, int, int, int], tuple[str, ...]] = LRUCache(
+    settings.split_cache_size
+)
+
+
 class ChunkingService:
     """Service for splitting text into chunks."""
     
     def __init__(
         self,
         chunk_size: int = settings.chunk_size,
-        chunk_overlap: int = settings.chunk_overlap
+        chunk_overlap: int = settings.chunk_overlap,
+        min_words_cut: int = settings.chunk_min_words_cut
     ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        # When set, the overlap is split between neighbouring chunks
+        # instead of repeated: a chunk hands its last min_words_cut words
+        # to the next one, which starts there
+        self.min_words_cut = min_words_cut
     
     def split_text(self, text: str) -> list[str]:
         """Split text into overlapping chunks."""
-        if not text:
+        # Whitespace-only text (e.g. from scanned pages) has no chunks;
+        # isspace() stops at the first other character
+        if not text or text.isspace():
             return []
         
-        chunks = []
-        start = 0
-        text_length = len(text)
+        if len(text) <= self.chunk_size - self.chunk_overlap:
+            # One window covers the text and the next would start past
+            # its end, so it is a single chunk
+            chunk = text.strip()
+            return [chunk] if chunk else []
         
-        while start < text_length:
-            end = start + self.chunk_size
-            
-            # If not at the end, try to break at a sentence boundary
-            if end < text_length:
-                # Look for sentence endings within the chunk
-                for sep in ['. ', '.\n', '? ', '!\n', '\n\n']:
-                    last_sep = text[start:end].rfind(sep)
-                    if last_sep != -1 and last_sep > self.chunk_size // 2:
-                        end = start + last_sep + len(sep)
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - self.chunk_overlap
+        key = (text, self.chunk_size, self.chunk_overlap, self.min_words_cut)
+        cached = _split_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        
+        stride = self.chunk_size - self.chunk_overlap
+        if stride > 0 and not self.min_words_cut and _SEPARATOR_RE.search(text) is None:
+            # No sentence boundaries: every window is full size, so the
+            # chunk starts are a fixed stride apart
+            chunks = [
+                chunk
+                for i in range(0, len(text), stride)
+                if (chunk := text[i:i + self.chunk_size].strip())
+            ]
+        else:
+            chunks = list(self.iter_chunks([text]))
         
         logger.debug(
             "Split text into chunks",
-            total_length=text_length,
+            total_length=len(text),
             chunks=len(chunks),
-            avg_chunk_size=text_length // len(chunks) if chunks else 0
+            avg_chunk_size=len(text) // len(chunks) if chunks else 0
         )
         
+        if len(text) <= settings.split_cache_max_chars:
+            _split_cache.set(key, tuple(chunks))
+        
         return chunks
+    
+    @staticmethod
+    def clear_cache() -> None:
+        """Drop all memoized split_text results."""
+        _split_cache.clear()
+    
+    def split_tokens(self, text: str, tokenizer: Tokenizer) -> list[list[int]]:
+        """
+        Split text into overlapping windows of token IDs.
+        
+        The text is encoded once and the windows are sliced from the IDs,
+        so overlapping regions are not tokenized twice. chunk_size and
+        chunk_overlap count tokens here; the last window ends at the last
+        token.
+        """
+        ids = tokenizer.encode(text)
+        if not ids:
+            return []
+        
+        stride = self.chunk_size - self.chunk_overlap
+        if stride <= 0:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        
+        return [
+            ids[start:start + self.chunk_size]
+            for start in range(0, max(len(ids) - self.chunk_overlap, 1), stride)
+        ]
+    
+    def split_text_spans(self, text: str) -> np.ndarray:
+        """
+        Return the (start, end) offsets of split_text's chunks in text.
+        
+        One (N, 2) int32 array instead of N strings, for callers that
+        only need positions or lengths; text[start:end] is the chunk.
+        """
+        spans = []
+        for buffer, offset, start, end in self._iter_windows([text]):
+            window = buffer[start:end]
+            chunk = window.strip()
+            if chunk:
+                # Everything before the stripped chunk is whitespace, so
+                # its first occurrence is where it starts
+                chunk_start = offset + start + window.find(chunk)
+                spans.append((chunk_start, chunk_start + len(chunk)))
+        return np.array(spans, dtype=np.int32).reshape(-1, 2)
+    
+    def iter_chunks(self, pages: Iterable[str]) -> Iterator[str]:
+        """
+        Split streamed pages, joined by blank lines, into overlapping chunks.
+        
+        Only the unconsumed tail of the text is held, so memory stays near
+        one page plus one chunk. Yields the same chunks as split_text on
+        the joined text.
+        """
+        for buffer, _, start, end in self._iter_windows(pages):
+            chunk = buffer[start:end].strip()
+            if chunk:
+                yield chunk
+    
+    def _iter_windows(self, pages: Iterable[str]) -> Iterator[tuple[str, int, int, int]]:
+        """
+        Yield (buffer, offset, start, end) for each chunk window.
+        
+        The window is buffer[start:end], unstripped; offset is where
+        buffer begins in the joined text.
+        """
+        pages = iter(pages)
+        buffer = ""
+        offset = 0
+        start = 0
+        joiner = ""
+        exhausted = False
+        
+        while True:
+            # Refill until a full window plus one character is buffered,
+            # so "not at the end" is known without the rest of the text
+            if not exhausted and len(buffer) - start <= self.chunk_size:
+                buffer = buffer[start:]
+                offset += start
+                start = 0
+                while not exhausted and len(buffer) <= self.chunk_size:
+                    page = next(pages, None)
+                    if page is None:
+                        exhausted = True
+                    else:
+                        buffer += joiner + page
+                        joiner = "\n\n"
+            
+            if start >= len(buffer):
+                return
+            
+            end = start + self.chunk_size
+            
+            # If not at the end, try to break at a sentence boundary
+            if end < len(buffer):
+                end = _find_break(buffer, start + self.chunk_size // 2 + 1, end)
+            
+            if self.min_words_cut:
+                if end >= len(buffer):
+                    # Last window: a tail window would only repeat words
+                    yield buffer, offset, start, end
+                    return
+                cut = _words_cut(buffer, end - self.chunk_overlap, end, self.min_words_cut)
+                yield buffer, offset, start, cut
+                start = cut
+                continue
+            
+            yield buffer, offset, start, end
+            
+            start = end - self.chunk_overlap
+
+
+def parse_and_chunk(
+    file_content: bytes | BinaryIO,
+    filename: str,
+    chunking_service: ChunkingService
+) -> list[str]:
+    """Extract text from a PDF and split it into chunks (CPU-bound)."""
+    # Pages stream straight into the chunker; the full text is never built
+    chunks = list(
+        chunking_service.iter_chunks(PDFService.extract_pages(file_content, filename))
+    )
+    
+    if not chunks:
+        raise ValueError("Could not extract text from PDF")
+    
+    return chunks
+
+
+def _spool_upload(file_content: bytes | BinaryIO, path: str) -> None:
+    """Write an upload to path for the ingest workers to open."""
+    with open(path, "wb") as f:
+        if isinstance(file_content, bytes):
+            f.write(file_content)
+        else:
+            shutil.copyfileobj(file_content, f)
+
+
+def _native_page_count(path: str) -> int:
+    """
+    Page count of a spooled PDF (worker task).
+    
+    0 if the file has no PDF header or the native parser cannot open it,
+    leaving those to parse_and_chunk's checks and PyPDF2 fallback.
+    """
+    with open(path, "rb") as f:
+        if not _has_pdf_header(f):
+            return 0
+    try:
+        return PDFService.page_count(path)
+    except Exception:
+        return 0
+
+
+def _parse_and_chunk_file(
+    path: str,
+    filename: str,
+    chunking_service: ChunkingService
+) -> list[str]:
+    """parse_and_chunk on a spooled PDF (worker task)."""
+    with open(path, "rb") as f:
+        return parse_and_chunk(f, filename, chunking_service)
+
+
+def _chunk_page_files(paths: list[str], chunking_service: ChunkingService) -> list[str]:
+    """Chunk the page texts of _page_range_texts tasks in order (worker task)."""
+    return list(chunking_service.iter_chunks(_read_page_files(paths)))
 
 
 class IngestionService:
     """Service for document ingestion pipeline."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        executor: Executor | None = None,
+        replace_executor: Callable[[Executor], Executor] | None = None
+    ):
         self.pdf_service = PDFService()
         self.chunking_service = ChunkingService()
         self.embedding_service = EmbeddingService()
+        # Process pool for PDF parsing and chunking; set on startup so a
+        # large ingest does not stall the event loop. None runs inline.
+        self.executor = executor
+        # Called with a pool broken by a crashed worker; returns the
+        # pool to use from then on
+        self.replace_executor = replace_executor
+    
+    async def _embed_chunks(self, chunks: list[str]) -> list[list[float]]:
+        """Embed chunks as concurrent API batches, returned in chunk order."""
+        batch_size = settings.ingest_embedding_batch_size
+        semaphore = asyncio.Semaphore(settings.ingest_embedding_concurrency)
+        
+        async def embed_batch(batch: list[str]) -> list[list[float]]:
+            async with semaphore:
+                return await self.embedding_service.get_embeddings_batch(batch)
+        
+        batches = await asyncio.gather(*(
+            embed_batch(chunks[i:i + batch_size])
+            for i in range(0, len(chunks), batch_size)
+        ))
+        return [embedding for batch in batches for embedding in batch]
+    
+    async def _parse_in_pool(
+        self,
+        executor: Executor,
+        file_content: bytes | BinaryIO,
+        filename: str
+    ) -> list[str]:
+        """
+        Extract and chunk a PDF in the process pool.
+        
+        The upload is spooled to a temporary file the workers open by
+        path, so its bytes are not pickled to each task, and PDFs are only
+        ever opened in the workers (PDFium is not thread-safe). Documents
+        longer than pdf_pages_per_task pages are extracted as page ranges
+        across the workers and chunked in page order by a final task;
+        others, and files the native parser cannot open, go to a single
+        parse_and_chunk task.
+        """
+        loop = asyncio.get_running_loop()
+        pages_per_task = settings.pdf_pages_per_task
+        workdir = await asyncio.to_thread(tempfile.mkdtemp, prefix="ingest-")
+        try:
+            path = os.path.join(workdir, "upload.pdf")
+            await asyncio.to_thread(_spool_upload, file_content, path)
+            
+            page_count = 0
+            if pages_per_task:
+                page_count = await loop.run_in_executor(executor, _native_page_count, path)
+            
+            if page_count <= pages_per_task:
+                return await loop.run_in_executor(
+                    executor,
+                    _parse_and_chunk_file,
+                    path,
+                    filename,
+                    self.chunking_service,
+                )
+            
+            # Every task is waited for, even after one fails, so none is
+            # still writing into workdir when it is removed
+            results = await asyncio.gather(*(
+                loop.run_in_executor(
+                    executor,
+                    _page_range_texts,
+                    path,
+                    start,
+                    min(start + pages_per_task, page_count),
+                )
+                for start in range(0, page_count, pages_per_task)
+            ), return_exceptions=True)
+            errors = [result for result in results if isinstance(result, BaseException)]
+            for error in errors:
+                if isinstance(error, BrokenProcessPool):
+                    raise error
+            if errors:
+                logger.error("PDF extraction failed", filename=filename, error=str(errors[0]))
+                raise DocumentExtractionError(filename=filename, reason=str(errors[0]))
+            page_files = [result for result in results if isinstance(result, str)]
+            
+            logger.info(
+                "Extracted text from PDF",
+                filename=filename,
+                pages=page_count,
+                tasks=len(page_files)
+            )
+            
+            chunks = await loop.run_in_executor(
+                executor,
+                _chunk_page_files,
+                page_files,
+                self.chunking_service,
+            )
+            if not chunks:
+                raise ValueError("Could not extract text from PDF")
+            
+            return chunks
+        finally:
+            await asyncio.to_thread(shutil.rmtree, workdir, True)
     
     async def ingest_document(
         self,
         filename: str,
-        file_content: bytes,
+        file_content: bytes | BinaryIO,
         session: AsyncSession
     ) -> tuple[str, int]:
-        """Ingest a document: extract, chunk, embed, and store."""
+        """
+        Ingest a document: extract, chunk, embed, and store.
+        
+        file_content may be raw bytes or a seekable binary file (e.g. a
+        spooled upload), which the PDF parser reads without buffering it.
+        """
         # Generate document ID
         document_id = str(uuid.uuid4())
         
         logger.info(
             "Starting document ingestion",
             document_id=document_id,
-            filename=filename,
-            size_bytes=len(file_content)
+            filename=filename
         )
         
-        # Extract text from PDF
-        text = self.pdf_service.extract_text(file_content, filename)
-        
-        if not text:
-            raise ValueError("Could not extract text from PDF")
-        
-        # Split into chunks
-        chunks = self.chunking_service.split_text(text)
+        # Extract text from PDF and split into chunks
+        if self.executor is None:
+            chunks = parse_and_chunk(file_content, filename, self.chunking_service)
+        else:
+            executor = self.executor
+            try:
+                chunks = await self._parse_in_pool(executor, file_content, filename)
+            except BrokenProcessPool as e:
+                # A worker died (OOM, a crash in the native parser); later
+                # ingests get a fresh pool instead of failing too
+                logger.error("PDF worker process died", filename=filename)
+                if self.replace_executor is not None:
+                    self.executor = self.replace_executor(executor)
+                raise DocumentExtractionError(
+                    filename=filename,
+                    reason="PDF parser worker process died"
+                ) from e
         
-        if not chunks:
-            raise ValueError("No chunks generated from document")
-        
-        # Generate embeddings in batch
-        embeddings = await self.embedding_service.get_embeddings_batch(chunks)
+        # Generate embeddings in batch, converted to FP16 in one pass so the
+        # per-row halfvec binding reuses these buffers without copying
+        embeddings = np.asarray(
+            await self._embed_chunks(chunks),
+            dtype=HALFVEC_DTYPE,
+        )
         
         # Create and store document chunks
-        for idx, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-            doc_chunk = DocumentChunk(
+        doc_chunks = [
+            DocumentChunk(
                 document_id=document_id,
                 document_name=filename,
                 content=chunk_text,
                 chunk_index=idx,
                 embedding=embedding
             )
-            session.add(doc_chunk)
+            for idx, (chunk_text, embedding) in enumerate(zip(chunks, embeddings))
+        ]
+        document = Document(id=document_id, name=filename, chunk_count=len(chunks))
+        
+        if len(doc_chunks) > settings.bulk_copy_threshold:
+            # Large documents: binary COPY instead of per-row INSERTs
+            await DocumentRepository(session).bulk_copy_chunks(doc_chunks, document)
+        else:
+            session.add_all(doc_chunks)
+            session.add(document)
+            await session.commit()
         
-        await session.commit()
+        # Build the IVFFlat index in the background once this ingest gives
+        # it enough rows; the document is stored whatever happens to it
+        schedule_ivfflat_index(len(chunks))
         
         logger.info(
             "Document ingestion completed",
@@ -259,52 +949,88 @@ class IngestionService:
         return document_id, len(chunks)
 
 
+SYSTEM_PROMPT_PREFIX = """You are a helpful AI assistant with access to a knowledge base. 
+Answer questions based on the provided context. If the context doesn't contain 
+relevant information, say so and provide a general answer if possible.
+Always cite the source documents when using information from the context.
+
+Context from knowledge base:
+"""
+
+
+async def _sse_data(response: httpx.Response) -> AsyncIterator[bytes]:
+    """
+    Yield the payload of each SSE "data:" line until "[DONE]".
+    
+    Splits raw bytes on newlines instead of decoding every line to str.
+    """
+    buffer = b""
+    async for block in response.aiter_bytes():
+        buffer += block
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.startswith(b"data: "):
+                data = line[6:].rstrip(b"\r")
+                if data == b"[DONE]":
+                    return
+                yield data
+    
+    # A final line without a trailing newline
+    if buffer.startswith(b"data: "):
+        data = buffer[6:].rstrip(b"\r")
+        if data != b"[DONE]":
+            yield data
+
+
 class ChatService:
     """Service for RAG-powered chat with resilience."""
     
-    def __init__(self):
-        self.embedding_service = EmbeddingService()
-        self.client = httpx.AsyncClient(timeout=120.0)
+    def __init__(self, client: httpx.AsyncClient | None = None):
+        self.embedding_service = EmbeddingService(client)
+        self.query_batcher = MicroBatcher(
+            self._embed_queries,
+            max_batch_size=settings.embedding_batch_max_size,
+            max_wait_ms=settings.embedding_batch_wait_ms,
+        )
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """HTTP client for chat completions, shared with the embedding service."""
+        return self.embedding_service.client
+    
+    async def embed_query(self, message: str) -> list[float]:
+        """Embed a chat query, batched with concurrent queries into one API call."""
+        # Repeated queries are answered from the shared embedding cache
+        # without waiting for a batch
+        cached = _embedding_cache.get(_embedding_key(message))
+        if cached is not None:
+            return cached.tolist()
+        return await self.query_batcher.submit(message)
+    
+    async def _embed_queries(self, messages: list[str]) -> list[list[float]]:
+        """Embed a batch of queries, sending duplicate messages only once."""
+        unique = list(dict.fromkeys(messages))
+        embeddings = dict(
+            zip(unique, await self.embedding_service.get_embeddings_batch(unique))
+        )
+        return [embeddings[message] for message in messages]
     
     async def similarity_search(
         self,
         query_embedding: list[float],
-        session: AsyncSession,
         top_k: int = 5
-    ) -> list[DocumentChunk]:
+    ) -> list[ChunkHit]:
         """Find most similar document chunks."""
-        # Use pgvector's L2 distance for similarity search
-        embedding_str = f"[{','.join(map(str, query_embedding))}]"
-        
-        query = text(f"""
-            SELECT id, document_id, document_name, content, chunk_index, created_at,
-                   embedding <-> '{embedding_str}'::vector AS distance
-            FROM document_chunks
-            ORDER BY distance
-            LIMIT :limit
-        """)
-        
-        result = await session.execute(query, {"limit": top_k})
-        rows = result.fetchall()
-        
-        chunks = []
-        for row in rows:
-            chunk = DocumentChunk(
-                id=row.id,
-                document_id=row.document_id,
-                document_name=row.document_name,
-                content=row.content,
-                chunk_index=row.chunk_index,
-                created_at=row.created_at,
-                embedding=[]  # Don't return embeddings
-            )
-            chunks.append(chunk)
+        # The asyncpg pool binds the query vector in pgvector's binary
+        # format; the ORM column type would format it as a text literal
+        rows = (await fetch_nearest_chunks([query_embedding], top_k))[0]
+        chunks = rows_to_hits(rows)
         
         logger.debug("Similarity search completed", results=len(chunks))
         
         return chunks
     
-    def build_context(self, chunks: list[DocumentChunk]) -> str:
+    def build_context(self, chunks: list[ChunkHit]) -> str:
         """Build context string from retrieved chunks."""
         if not chunks:
             return "No relevant documents found in the knowledge base."
@@ -330,23 +1056,15 @@ class ChatService:
         history: list[dict] | None = None
     ) -> AsyncIterator[str]:
         """Stream chat response from OpenRouter with retry."""
-        
-        system_prompt = """You are a helpful AI assistant with access to a knowledge base. 
-Answer questions based on the provided context. If the context doesn't contain 
-relevant information, say so and provide a general answer if possible.
-Always cite the source documents when using information from the context.
-
-Context from knowledge base:
-{context}"""
-        
-        messages = [
-            {"role": "system", "content": system_prompt.format(context=context)}
-        ]
+        messages = [{"role": "system", "content": SYSTEM_PROMPT_PREFIX + context}]
         
         # Add conversation history if provided
         if history:
-            for msg in history[-10:]:  # Keep last 10 messages
-                messages.append({"role": msg["role"], "content": msg["content"]})
+            # Keep last 10 messages; only slice when there are more
+            recent = history[-10:] if len(history) > 10 else history
+            messages.extend(
+                {"role": msg["role"], "content": msg["content"]} for msg in recent
+            )
         
         messages.append({"role": "user", "content": message})
         
@@ -360,11 +1078,12 @@ Context from knowledge base:
                     "Authorization": f"Bearer {settings.openrouter_api_key}",
                     "Content-Type": "application/json"
                 },
-                json={
+                content=orjson.dumps({
                     "model": settings.openrouter_model,
                     "messages": messages,
                     "stream": True
-                }
+                }),
+                timeout=120.0
             ) as response:
                 if response.status_code == 429:
                     retry_after = int(response.headers.get("Retry-After", 30))
@@ -372,20 +1091,19 @@ Context from knowledge base:
                 
                 response.raise_for_status()
                 
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        
-                        try:
-                            chunk = json.loads(data)
-                            if chunk.get("choices") and chunk["choices"][0].get("delta"):
-                                content = chunk["choices"][0]["delta"].get("content", "")
-                                if content:
-                                    yield content
-                        except json.JSONDecodeError:
-                            continue
+                async for data in _sse_data(response):
+                    try:
+                        chunk = orjson.loads(data)
+                    except orjson.JSONDecodeError:
+                        continue
+                    
+                    choices = chunk.get("choices")
+                    if choices:
+                        delta = choices[0].get("delta")
+                        if delta:
+                            content = delta.get("content")
+                            if content:
+                                yield content
                 
                 logger.info("Chat stream completed")
                 
@@ -394,6 +1112,5 @@ Context from knowledge base:
             raise LLMConnectionError(service="OpenRouter", reason=str(e))
     
     async def close(self):
-        """Close HTTP clients."""
-        await self.client.aclose()
+        """Close the HTTP client, unless it is the shared one."""
         await self.embedding_service.close()
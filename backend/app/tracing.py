@@ -5,7 +5,7 @@ from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from opentelemetry.sdk.resources import Resource, SERVICE_NAME
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
@@ -21,7 +21,7 @@ def setup_tracing(
     
     Args:
         service_name: Name of the service for traces
-        otlp_endpoint: OTLP collector endpoint (e.g., "http://otel-collector:4317")
+        otlp_endpoint: OTLP/HTTP collector endpoint (e.g., "http://otel-collector:4318")
         enabled: Whether to enable tracing
     """
     if not enabled:
@@ -40,10 +40,18 @@ def setup_tracing(
     # Create tracer provider
     provider = TracerProvider(resource=resource)
     
-    # Add OTLP exporter if endpoint is configured
+    # Add OTLP exporter if endpoint is configured (protobuf over HTTP)
     if endpoint:
-        otlp_exporter = OTLPSpanExporter(endpoint=endpoint, insecure=True)
-        provider.add_span_processor(BatchSpanProcessor(otlp_exporter))
+        if not endpoint.rstrip("/").endswith("/v1/traces"):
+            endpoint = endpoint.rstrip("/") + "/v1/traces"
+        otlp_exporter = OTLPSpanExporter(endpoint=endpoint)
+        # Larger queue and batches so bursts of requests do not drop spans
+        provider.add_span_processor(BatchSpanProcessor(
+            otlp_exporter,
+            max_queue_size=8192,
+            max_export_batch_size=1024,
+            schedule_delay_millis=2000,
+        ))
     
     # Set global tracer provider
     trace.set_tracer_provider(provider)
@@ -4,11 +4,12 @@ import asyncio
 from typing import AsyncGenerator, Generator
 import pytest
 from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel
 
 from app.main import app
-from app.database import get_session
+from app.database import get_session, get_read_session
 from app.models import DocumentChunk
 
 
@@ -25,35 +26,48 @@ def event_loop() -> Generator:
 
 
 @pytest.fixture(scope="session")
-async def test_engine():
-    """Create test database engine."""
+async def test_engine(event_loop):
+    """Create test database engine and its tables, once per session."""
     engine = create_async_engine(
         TEST_DATABASE_URL,
         echo=False,
     )
+    
+    # Let SQLAlchemy, not the sqlite3 driver, emit BEGIN so that
+    # SAVEPOINTs work inside the per-test transaction
+    @event.listens_for(engine.sync_engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine.sync_engine, "begin")
+    def emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+    
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    
     yield engine
     await engine.dispose()
 
 
 @pytest.fixture
 async def test_session(test_engine) -> AsyncGenerator[AsyncSession, None]:
-    """Create a test database session."""
-    async_session = sessionmaker(
-        test_engine, class_=AsyncSession, expire_on_commit=False
-    )
-    
-    async with test_engine.begin() as conn:
-        # Create tables
-        from app.models import SQLModel
-        await conn.run_sync(SQLModel.metadata.create_all)
-    
-    async with async_session() as session:
+    """
+    Create a test database session inside a transaction rolled back after
+    the test; commits in the code under test only release a SAVEPOINT.
+    """
+    async with test_engine.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(
+            bind=connection,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
+        
         yield session
-        await session.rollback()
-    
-    # Clean up tables after test
-    async with test_engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.drop_all)
+        
+        await session.close()
+        await transaction.rollback()
 
 
 @pytest.fixture
@@ -64,6 +78,7 @@ async def client(test_session: AsyncSession) -> AsyncGenerator[AsyncClient, None
         yield test_session
     
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_session
     
     async with AsyncClient(
         transport=ASGITransport(app=app),
@@ -16,6 +16,40 @@ class TestHealthEndpoints:
         data = response.json()
         assert data["status"] == "healthy"
         assert data["service"] == "rag-backend"
+    
+    @pytest.mark.integration
+    async def test_cors_headers(self, client: AsyncClient):
+        """Test responses allow any origin."""
+        response = await client.get("/health", headers={"origin": "http://example.com"})
+        
+        assert response.headers["access-control-allow-origin"] == "*"
+    
+    @pytest.mark.integration
+    async def test_cors_preflight(self, client: AsyncClient):
+        """Test preflight requests are answered directly."""
+        response = await client.options(
+            "/api/v1/chat",
+            headers={
+                "origin": "http://example.com",
+                "access-control-request-method": "POST",
+            },
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["access-control-allow-origin"] == "*"
+        assert "POST" in response.headers["access-control-allow-methods"]
+    
+    @pytest.mark.integration
+    async def test_plain_options_reaches_app(self, client: AsyncClient):
+        """Test OPTIONS without preflight headers is handled by the app."""
+        response = await client.options(
+            "/api/v1/chat",
+            headers={"origin": "http://example.com"},
+        )
+        
+        assert response.status_code == 405
+        assert "POST" in response.headers["allow"]
+        assert response.headers["access-control-allow-origin"] == "*"
 
 
 class TestDocumentEndpoints:
@@ -47,6 +81,21 @@ class TestDocumentEndpoints:
         assert response.status_code == 400
         assert "PDF" in response.json()["detail"]
     
+    @pytest.mark.integration
+    async def test_ingest_rejects_oversized_content_length(self, client: AsyncClient):
+        """Test oversized uploads are rejected from the Content-Length header."""
+        response = await client.post(
+            "/api/v1/ingest",
+            content=b"--x--",
+            headers={
+                "content-type": "multipart/form-data; boundary=x",
+                "content-length": str(100 * 1024 * 1024),
+            },
+        )
+        
+        assert response.status_code == 413
+        assert response.json()["detail"] == "File size exceeds 50MB limit"
+    
     @pytest.mark.integration
     async def test_delete_nonexistent_document(self, client: AsyncClient):
         """Test deleting non-existent document returns 404."""
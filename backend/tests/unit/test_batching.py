@@ -0,0 +1,94 @@
+"""Unit tests for batching module."""
+
+import asyncio
+import pytest
+from app.batching import MicroBatcher
+
+
+class TestMicroBatcher:
+    """Tests for MicroBatcher."""
+    
+    @pytest.mark.unit
+    async def test_concurrent_submits_share_one_call(self):
+        """Test that concurrent submissions are handled in a single batch."""
+        calls = []
+        
+        async def handler(items):
+            calls.append(list(items))
+            return [item * 2 for item in items]
+        
+        batcher = MicroBatcher(handler, max_batch_size=10, max_wait_ms=5)
+        
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(4)))
+        
+        assert results == [0, 2, 4, 6]
+        assert calls == [[0, 1, 2, 3]]
+    
+    @pytest.mark.unit
+    async def test_full_batch_flushes_immediately(self):
+        """Test that reaching max_batch_size dispatches without waiting."""
+        calls = []
+        
+        async def handler(items):
+            calls.append(list(items))
+            return items
+        
+        batcher = MicroBatcher(handler, max_batch_size=2, max_wait_ms=10_000)
+        
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.submit("a"), batcher.submit("b")),
+            timeout=1
+        )
+        
+        assert results == ["a", "b"]
+        assert calls == [["a", "b"]]
+    
+    @pytest.mark.unit
+    async def test_handler_error_propagates_to_all(self):
+        """Test that a failing batch raises in every waiter."""
+        async def handler(items):
+            raise RuntimeError("boom")
+        
+        batcher = MicroBatcher(handler, max_batch_size=10, max_wait_ms=1)
+        
+        results = await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+        
+        assert all(isinstance(r, RuntimeError) for r in results)
+    
+    @pytest.mark.unit
+    async def test_short_result_list_fails_all(self):
+        """Test that a handler returning too few results fails every waiter."""
+        async def handler(items):
+            return items[:1]
+        
+        batcher = MicroBatcher(handler, max_batch_size=10, max_wait_ms=1)
+        
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True),
+            timeout=1
+        )
+        
+        assert all(isinstance(r, RuntimeError) for r in results)
+    
+    @pytest.mark.unit
+    async def test_cancelled_batch_cancels_waiters(self):
+        """Test that waiters do not hang when the batch task is cancelled."""
+        started = asyncio.Event()
+        
+        async def handler(items):
+            started.set()
+            await asyncio.Event().wait()
+        
+        batcher = MicroBatcher(handler, max_batch_size=2, max_wait_ms=1)
+        waiters = asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+        await started.wait()
+        
+        for task in list(batcher._tasks):
+            task.cancel()
+        results = await asyncio.wait_for(waiters, timeout=1)
+        
+        assert all(isinstance(r, asyncio.CancelledError) for r in results)
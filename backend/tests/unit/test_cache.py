@@ -0,0 +1,29 @@
+"""Unit tests for cache module."""
+
+import pytest
+from app.cache import LRUCache
+
+
+class TestLRUCache:
+    """Tests for LRUCache."""
+    
+    @pytest.mark.unit
+    def test_get_missing(self):
+        """Test that a missing key returns None."""
+        cache = LRUCache(maxsize=2)
+        
+        assert cache.get("missing") is None
+    
+    @pytest.mark.unit
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted when full."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+        assert len(cache) == 2
@@ -0,0 +1,51 @@
+"""Unit tests for exceptions module."""
+
+import pickle
+
+import pytest
+from app.exceptions import (
+    RAGException,
+    DocumentException,
+    DocumentNotFoundError,
+    DocumentExtractionError,
+    DocumentTooLargeError,
+    UnsupportedFileTypeError,
+    EmbeddingException,
+    EmbeddingGenerationError,
+    LLMException,
+    LLMConnectionError,
+    LLMRateLimitError,
+    DatabaseException,
+    DatabaseConnectionError,
+    VectorSearchError,
+)
+
+
+class TestExceptionPickling:
+    """Tests for pickling exceptions across the ingest process pool."""
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("exc", [
+        RAGException("base", {"key": "value"}),
+        DocumentException("document"),
+        DocumentNotFoundError("doc-1"),
+        DocumentExtractionError("a.pdf", "not a PDF file"),
+        DocumentTooLargeError("a.pdf", 100, 10),
+        UnsupportedFileTypeError("a.txt", "text/plain"),
+        EmbeddingException("embedding"),
+        EmbeddingGenerationError("timeout", retry_after=5),
+        LLMException("llm"),
+        LLMConnectionError("OpenRouter", "refused"),
+        LLMRateLimitError(30),
+        DatabaseException("database"),
+        DatabaseConnectionError("pool closed"),
+        VectorSearchError("bad vector"),
+    ], ids=lambda exc: type(exc).__name__)
+    def test_round_trip_keeps_type_and_state(self, exc):
+        """Test that an exception unpickles to the same type, message and details."""
+        restored = pickle.loads(pickle.dumps(exc))
+        
+        assert type(restored) is type(exc)
+        assert restored.message == exc.message
+        assert restored.details == exc.details
+        assert restored.args == exc.args
@@ -1,7 +1,43 @@
 """Unit tests for services module."""
 
+import tracemalloc
+
 import pytest
-from app.services import ChunkingService, PDFService
+from app.services import ChunkingService, EmbeddingService, IngestionService, PDFService
+
+
+def make_pdf(pages: int, lines: int = 40) -> bytes:
+    """Build an uncompressed PDF with `lines` lines of Helvetica text per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        text = b"".join(
+            b"(Page %d line %d has a sentence of filler text. ) Tj T* " % (page, line)
+            for line in range(lines)
+        )
+        stream = b"BT /F1 10 Tf 12 TL 40 760 Td " + text + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF" % (len(objects) + 1, xref)
+    return bytes(out)
 
 
 class TestChunkingService:
@@ -49,6 +85,21 @@ class TestChunkingService:
         assert len(chunks) == 1
         assert chunks[0] == "Short text"
     
+    @pytest.mark.unit
+    def test_split_text_short_is_stripped(self):
+        """Test that short text comes back stripped, and whitespace-only text empty."""
+        service = ChunkingService(chunk_size=1000, chunk_overlap=100)
+        
+        assert service.split_text("  Short text\n\n") == ["Short text"]
+        assert service.split_text(" \n\t ") == []
+    
+    @pytest.mark.unit
+    def test_split_text_whitespace_only(self):
+        """Test that long whitespace-only text yields no chunks."""
+        service = ChunkingService(chunk_size=100, chunk_overlap=20)
+        
+        assert service.split_text("\n" * 100_000) == []
+    
     @pytest.mark.unit
     def test_split_text_overlap(self):
         """Test that chunks have proper overlap."""
@@ -59,6 +110,99 @@ class TestChunkingService:
         
         # With proper overlap, total length should be > original due to overlap
         assert len(chunks) >= 2
+    
+    @pytest.mark.unit
+    def test_split_text_min_words_cut_splits_overlap(self):
+        """Test that with min_words_cut no word repeats between consecutive chunks."""
+        service = ChunkingService(chunk_size=100, chunk_overlap=20, min_words_cut=10)
+        words = [f"w{i}." for i in range(300)]
+        
+        chunks = service.split_text(" ".join(words))
+        
+        assert len(chunks) > 1
+        for previous, current in zip(chunks, chunks[1:]):
+            assert not set(previous.split()) & set(current.split())
+        assert [word for chunk in chunks for word in chunk.split()] == words
+    
+    @pytest.mark.unit
+    def test_split_text_breaks_after_last_sentence_end(self):
+        """Test that a chunk ends after the last sentence end in its window."""
+        service = ChunkingService(chunk_size=50, chunk_overlap=10)
+        text = "First sentence is here. Second one follows it. " + "x" * 60
+        
+        chunks = service.split_text(text)
+        
+        assert chunks[0] == "First sentence is here. Second one follows it."
+    
+    @pytest.mark.unit
+    def test_split_text_reuses_cached_result(self, monkeypatch):
+        """Test that repeated splits of the same text are served from the cache."""
+        service = ChunkingService(chunk_size=100, chunk_overlap=20)
+        ChunkingService.clear_cache()
+        calls = []
+        original = ChunkingService.iter_chunks
+        
+        def counting_iter_chunks(self, pages):
+            calls.append(1)
+            return original(self, pages)
+        
+        monkeypatch.setattr(ChunkingService, "iter_chunks", counting_iter_chunks)
+        text = "This is a sentence. " * 20
+        
+        first = service.split_text(text)
+        first.append("mutated")
+        second = service.split_text(text)
+        other = ChunkingService(chunk_size=80, chunk_overlap=20).split_text(text)
+        
+        assert second == first[:-1]
+        assert other != second
+        assert len(calls) == 2
+        ChunkingService.clear_cache()
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("token_count", [1, 5, 10, 57, 100])
+    def test_split_tokens_windows_cover_ids_once(self, token_count):
+        """Test that token windows overlap by chunk_overlap and end at the last token."""
+        class WordTokenizer:
+            def encode(self, text):
+                return [int(word) for word in text.split()]
+        
+        service = ChunkingService(chunk_size=10, chunk_overlap=3)
+        ids = list(range(token_count))
+        
+        windows = service.split_tokens(" ".join(map(str, ids)), WordTokenizer())
+        
+        assert windows[0][0] == 0
+        assert windows[-1][-1] == ids[-1]
+        assert sum(len(window) for window in windows) == len(ids) + 3 * (len(windows) - 1)
+        assert all(len(window) <= 10 for window in windows)
+    
+    @pytest.mark.unit
+    def test_split_text_spans_slice_to_chunks(self):
+        """Test that span offsets slice the text into split_text's chunks."""
+        service = ChunkingService(chunk_size=100, chunk_overlap=20)
+        text = "  First sentence here. Second one follows.\n\n" * 200
+        
+        spans = service.split_text_spans(text)
+        chunks = service.split_text(text)
+        
+        assert spans.shape == (len(chunks), 2)
+        assert [text[start:end] for start, end in spans] == chunks
+        assert spans.nbytes < sum(len(chunk) for chunk in chunks)
+    
+    @pytest.mark.unit
+    def test_iter_chunks_matches_split_text_on_joined_pages(self):
+        """Test that streamed pages chunk the same as their joined text."""
+        service = ChunkingService(chunk_size=60, chunk_overlap=10)
+        pages = [
+            "Page one has a sentence. And another one here!\nMore text " * 3,
+            "Short page.",
+            "Page three rambles on without any sentence end " * 4,
+        ]
+        
+        chunks = list(service.iter_chunks(pages))
+        
+        assert chunks == service.split_text("\n\n".join(pages))
 
 
 class TestPDFService:
@@ -79,3 +223,315 @@ class TestPDFService:
         
         with pytest.raises(DocumentExtractionError):
             PDFService.extract_text(b"", "empty.pdf")
+    
+    @pytest.mark.unit
+    def test_extract_text_rejects_missing_header_before_parsing(self, monkeypatch):
+        """Test that input without a PDF header never reaches a parser."""
+        import app.services as services
+        from app.exceptions import DocumentExtractionError
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("parser invoked")
+        
+        monkeypatch.setattr(services, "fitz", None)
+        monkeypatch.setattr(services.pdfium, "PdfDocument", fail)
+        monkeypatch.setattr(services, "PdfReader", fail)
+        
+        with pytest.raises(DocumentExtractionError, match="not a PDF file"):
+            PDFService.extract_text(b"GIF89a" + b"\0" * 2048, "image.pdf")
+    
+    @pytest.mark.unit
+    def test_extract_text_allows_leading_bytes_before_header(self, sample_pdf_content: bytes):
+        """Test that a header within the first kilobyte is accepted."""
+        text = PDFService.extract_text(b"\n" * 100 + sample_pdf_content, "padded.pdf")
+        
+        assert text == "Hello World"
+    
+    @pytest.mark.unit
+    def test_extract_text_aborts_on_slow_page(self, sample_pdf_content: bytes, monkeypatch):
+        """Test that a page exceeding the per-page time limit aborts extraction."""
+        import app.services as services
+        from app.exceptions import DocumentExtractionError
+        
+        services._page_text_cache.clear()
+        monkeypatch.setattr(services.settings, "pdf_page_timeout_seconds", -1.0)
+        
+        with pytest.raises(DocumentExtractionError, match="took longer"):
+            PDFService.extract_text(sample_pdf_content, "slow.pdf")
+    
+    @pytest.mark.unit
+    def test_pymupdf_opens_files_by_path(self, sample_pdf_content: bytes, tmp_path, monkeypatch):
+        """Test that PyMuPDF is given a file's path instead of its bytes."""
+        import io
+        import app.services as services
+        
+        opened = []
+        
+        class FakeDocument:
+            def pages(self, start=None, stop=None):
+                return iter(())
+            
+            def close(self):
+                pass
+        
+        class FakeFitz:
+            @staticmethod
+            def open(filename=None, stream=None, filetype=None):
+                opened.append((filename, stream))
+                return FakeDocument()
+        
+        monkeypatch.setattr(services, "fitz", FakeFitz)
+        path = tmp_path / "upload.pdf"
+        path.write_bytes(sample_pdf_content)
+        
+        services._page_text_cache.clear()
+        with open(path, "rb") as f:
+            list(PDFService.extract_pages(f))
+        services._page_text_cache.clear()
+        list(PDFService.extract_pages(io.BytesIO(sample_pdf_content)))
+        services._page_text_cache.clear()
+        
+        assert opened == [(str(path), None), (None, sample_pdf_content)]
+    
+    @pytest.mark.unit
+    def test_extract_text_minimal_pdf(self, sample_pdf_content: bytes):
+        """Test extraction of text from a minimal valid PDF."""
+        text = PDFService.extract_text(sample_pdf_content, "sample.pdf")
+        
+        assert text == "Hello World"
+    
+    @pytest.mark.unit
+    def test_extract_text_reuses_cached_text(self, sample_pdf_content: bytes, monkeypatch):
+        """Test that identical PDF bytes are only parsed once."""
+        import app.services as services
+        
+        services._page_text_cache.clear()
+        calls = []
+        for name in ("_pymupdf_page_texts", "_pdfium_page_texts"):
+            original = getattr(services, name)
+            
+            def counting(doc, original=original):
+                calls.append(doc)
+                return original(doc)
+            
+            monkeypatch.setattr(services, name, counting)
+        
+        first = PDFService.extract_text(sample_pdf_content, "sample.pdf")
+        second = PDFService.extract_text(sample_pdf_content, "copy.pdf")
+        
+        assert first == second == "Hello World"
+        assert len(calls) == 1
+        services._page_text_cache.clear()
+    
+    @pytest.mark.unit
+    def test_extract_pages_streams_large_documents(self, monkeypatch):
+        """Test that chunking a large PDF never holds its full text in memory."""
+        import app.services as services
+        
+        services._page_text_cache.clear()
+        monkeypatch.setattr(services.settings, "pdf_text_cache_max_chars", 10_000)
+        data = make_pdf(pages=600)
+        characters = sum(len(page) for page in PDFService.extract_pages(data))
+        services._page_text_cache.clear()
+        
+        tracemalloc.start()
+        try:
+            chunks = sum(
+                1 for _ in ChunkingService().iter_chunks(PDFService.extract_pages(data))
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        assert chunks > 0
+        assert peak < characters // 2
+
+
+class TestEmbeddingService:
+    """Tests for EmbeddingService."""
+    
+    @pytest.mark.unit
+    async def test_shared_client_is_reopened_after_shutdown(self):
+        """Test that a restarted app does not reuse the client its shutdown closed."""
+        from app import services
+        
+        service = EmbeddingService()
+        first = services.open_http_client()
+        service.client = first
+        await services.close_http_client()
+        
+        second = services.open_http_client()
+        service.client = second
+        
+        assert first.is_closed
+        assert not second.is_closed
+        assert service.client is second
+        await services.close_http_client()
+        
+        fallback = EmbeddingService().client
+        assert fallback is services.http_client
+        assert not fallback.is_closed
+        await services.close_http_client()
+    
+    @pytest.mark.unit
+    async def test_batch_requests_only_uncached_texts(self, monkeypatch):
+        """Test that cached and duplicate texts are not sent to the API."""
+        from app.services import _embedding_cache
+        
+        _embedding_cache.clear()
+        service = EmbeddingService()
+        calls = []
+        
+        async def fake_request(texts):
+            calls.append(texts)
+            return [[float(len(text))] for text in texts]
+        
+        monkeypatch.setattr(service, "_request_embeddings", fake_request)
+        
+        first = await service.get_embeddings_batch(["a", "bb", "a"])
+        second = await service.get_embeddings_batch(["bb", "ccc"])
+        
+        assert first == [[1.0], [2.0], [1.0]]
+        assert second == [[2.0], [3.0]]
+        assert calls == [["a", "bb"], ["ccc"]]
+        _embedding_cache.clear()
+    
+    @pytest.mark.unit
+    async def test_repeated_query_served_from_shared_cache(self, monkeypatch):
+        """Test that a repeated chat query reuses the shared embedding cache."""
+        from app.services import ChatService, _embedding_cache
+        
+        _embedding_cache.clear()
+        service = ChatService()
+        calls = []
+        
+        async def fake_request(texts):
+            calls.append(texts)
+            return [[0.5, 0.25] for _ in texts]
+        
+        monkeypatch.setattr(service.embedding_service, "_request_embeddings", fake_request)
+        
+        first = await service.embed_query("what is rag?")
+        second = await service.embed_query("what is rag?")
+        
+        assert first == second == [0.5, 0.25]
+        assert calls == [["what is rag?"]]
+        _embedding_cache.clear()
+
+
+class TestIngestionService:
+    """Tests for IngestionService."""
+    
+    @pytest.mark.unit
+    async def test_embed_chunks_batches_in_order(self, monkeypatch):
+        """Test that chunks are embedded in batches and returned in order."""
+        service = IngestionService()
+        calls = []
+        
+        async def fake_batch(texts):
+            calls.append(texts)
+            return [[float(text)] for text in texts]
+        
+        monkeypatch.setattr(service.embedding_service, "get_embeddings_batch", fake_batch)
+        monkeypatch.setattr("app.services.settings.ingest_embedding_batch_size", 2)
+        
+        embeddings = await service._embed_chunks(["1", "2", "3", "4", "5"])
+        
+        assert embeddings == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+        assert len(calls) == 3
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("pages_per_task", [0, 3])
+    async def test_parse_in_pool_matches_inline_parse(self, pages_per_task, monkeypatch):
+        """Test that page-range extraction in the pool chunks like the inline path."""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services import parse_and_chunk
+        
+        monkeypatch.setattr("app.services.settings.pdf_pages_per_task", pages_per_task)
+        data = make_pdf(pages=10)
+        
+        # One thread: PDFium must not be entered from two at once
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            service = IngestionService(executor=executor)
+            chunks = await service._parse_in_pool(executor, data, "large.pdf")
+        
+        assert chunks == parse_and_chunk(data, "large.pdf", service.chunking_service)
+    
+    @pytest.mark.unit
+    async def test_broken_pool_is_replaced(self):
+        """Test that a crashed worker fails the ingest and swaps in a new pool."""
+        from concurrent.futures import Executor, Future, ThreadPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
+        from app.exceptions import DocumentExtractionError
+        
+        class BrokenExecutor(Executor):
+            def submit(self, fn, *args, **kwargs):
+                future = Future()
+                future.set_exception(BrokenProcessPool("worker died"))
+                return future
+        
+        broken = BrokenExecutor()
+        replaced = []
+        
+        with ThreadPoolExecutor(max_workers=1) as fresh:
+            def replace(executor):
+                replaced.append(executor)
+                return fresh
+            
+            service = IngestionService(executor=broken, replace_executor=replace)
+            
+            with pytest.raises(DocumentExtractionError):
+                await service.ingest_document("crash.pdf", make_pdf(pages=1), session=None)
+            
+            assert replaced == [broken]
+            assert service.executor is fresh
+    
+    @pytest.mark.unit
+    async def test_ivfflat_build_runs_in_background(self, monkeypatch):
+        """Test that the deferred IVFFlat build is not awaited and its errors stay in the task."""
+        import asyncio
+        from app import database
+        
+        started = asyncio.Event()
+        release = asyncio.Event()
+        
+        async def failing_build():
+            started.set()
+            await release.wait()
+            raise RuntimeError("build failed")
+        
+        monkeypatch.setattr(database, "ensure_ivfflat_index", failing_build)
+        monkeypatch.setattr(database, "ivfflat_index_pending", True)
+        monkeypatch.setattr(database, "ivfflat_rows", 0)
+        monkeypatch.setattr(database.settings, "ivfflat_lists", 2)
+        monkeypatch.setattr(database.settings, "ivfflat_min_rows_per_list", 5)
+        
+        database.schedule_ivfflat_index(9)
+        assert database._ivfflat_task is None
+        
+        database.schedule_ivfflat_index(1)
+        task = database._ivfflat_task
+        await started.wait()
+        database.schedule_ivfflat_index(1)
+        assert database._ivfflat_task is task
+        
+        release.set()
+        await task
+        assert database._ivfflat_task is None
+
+
+class TestSSEParsing:
+    """Tests for parsing the upstream chat SSE stream."""
+    
+    @pytest.mark.unit
+    async def test_sse_data_yields_payloads_until_done(self):
+        """Test that data payloads are yielded in order and [DONE] ends the stream."""
+        import httpx
+        from app.services import _sse_data
+        
+        body = b'data: {"a": 1}\r\n\r\n: comment\ndata: {"b": 2}\n\ndata: [DONE]\n\ndata: {"c": 3}\n'
+        response = httpx.Response(200, content=body)
+        
+        payloads = [data async for data in _sse_data(response)]
+        
+        assert payloads == [b'{"a": 1}', b'{"b": 2}']